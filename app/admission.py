@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import math
+
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import Depends, HTTPException
+from app.config import (
+    SEARCH_RATE_LIMIT, SEARCH_RATE_BURST, SEARCH_MAX_CONCURRENCY, SEARCH_MAX_QUEUE, SEARCH_QUEUE_TIMEOUT,
+    INDEX_RATE_LIMIT, INDEX_RATE_BURST, INDEX_MAX_CONCURRENCY, INDEX_MAX_QUEUE, INDEX_QUEUE_TIMEOUT,
+    EXPORT_MAX_CONCURRENCY, EXPORT_MAX_QUEUE, EXPORT_QUEUE_TIMEOUT
+)
+from app.database import redis_client
+from app.metrics import ADMISSION_REJECTED, ADMISSION_IN_PROGRESS, ADMISSION_QUEUED
+from app.models import ErrorResponse
+from app.security import validate_jwt_token
+
+logger = logging.getLogger(__name__)
+
+# Refill the bucket for the time elapsed (by the Redis clock, shared by every worker) and take `cost`
+# tokens if there are enough. Returns the seconds to wait for them, as a string so it is not truncated.
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = math.min(burst, (tonumber(bucket[1]) or burst) + math.max(0, now - (tonumber(bucket[2]) or now)) * rate)
+
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+def raise_rejected(budget: str, status_code: int, code: str, message: str, retry_after: float):
+    ADMISSION_REJECTED.labels(budget, code).inc()
+    error = ErrorResponse(code=code, message=message)
+    raise HTTPException(status_code=status_code, detail=error.model_dump(),
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class TokenBucket:
+    """
+    Rate limit shared by the workers: one Redis token bucket per subject, holding up to `burst`
+    tokens and refilled with `rate` tokens per second. Refill and take are a single atomic script.
+
+    A `rate` of 0 disables the limit. Redis errors let the request through.
+    """
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, subject: str, cost: int = 1):
+        """
+        Take `cost` tokens from the bucket of `subject`. Returns 0, or the seconds to wait if it is empty.
+        """
+        if self.rate <= 0:
+            return 0
+
+        try:
+            wait = await self.script(keys=[f"rate-limit:{self.name}:{subject}"], args=[self.rate, self.burst, cost])
+        except Exception:
+            logger.warning(f"Could not check the {self.name} rate limit of {subject}", exc_info=True)
+            return 0
+
+        return float(wait)
+
+
+class ConcurrencyLimiter:
+    """
+    Elasticsearch calls of this worker run at once, at most `limit`.
+
+    Calls past the limit wait for a slot in arrival order. Once `max_queue` calls are waiting, or
+    after `queue_timeout` seconds of waiting, calls are shed with 503 rather than piling up latency
+    for everyone else.
+    """
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiters = deque()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def hold(self, iterator):
+        """
+        Iterate over `iterator` holding a slot, taken before its first item and released once it is
+        exhausted or closed (e.g. when the client of a streamed response goes away).
+        """
+        async with self.slot():
+            async for item in iterator:
+                yield item
+
+    async def acquire(self):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            ADMISSION_IN_PROGRESS.labels(self.name).set(self.active)
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            self.shed()
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        ADMISSION_QUEUED.labels(self.name).set(len(self.waiters))
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                self.release()  # The slot was handed over as the wait ended
+            elif future in self.waiters:
+                self.waiters.remove(future)
+            ADMISSION_QUEUED.labels(self.name).set(len(self.waiters))
+
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed()
+            raise
+
+    def release(self):
+        # Hand the slot over to the oldest waiting call, if any
+        while self.waiters:
+            future = self.waiters.popleft()
+            ADMISSION_QUEUED.labels(self.name).set(len(self.waiters))
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self.active -= 1
+        ADMISSION_IN_PROGRESS.labels(self.name).set(self.active)
+
+    def shed(self):
+        raise_rejected(self.name, 503, "OVERLOADED", "Too many requests in progress, please retry later.",
+                       self.queue_timeout)
+
+
+class Budget:
+    """
+    Admission control of a group of endpoints reaching Elasticsearch: a rate limit per JWT subject
+    (`limit_rate`, a dependency answering 429, or `charge` for requests costing more than one) and a concurrency limit per worker (`slot`, around
+    the Elasticsearch calls, answering 503). Both rejections carry `Retry-After`.
+    """
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.bucket = TokenBucket(name, rate, burst)
+        self.limiter = ConcurrencyLimiter(name, concurrency, max_queue, queue_timeout)
+
+    async def limit_rate(self, payload: dict = Depends(validate_jwt_token)):
+        await self.charge(payload)
+
+    async def charge(self, payload: dict, cost: int = 1):
+        """
+        Count `cost` requests against the rate limit of the subject of `payload` (a decoded JWT).
+        A cost above the burst is capped to it, or it would never fit in the bucket.
+        """
+        subject = payload.get("sub", "anonymous")
+        wait = await self.bucket.take(subject, min(cost, self.bucket.burst))
+        if wait > 0:
+            logger.warning(f"Rate limit of {self.name} exceeded by {subject}")
+            raise_rejected(self.name, 429, "RATE_LIMITED", "Too many requests, please retry later.", wait)
+
+    def slot(self):
+        return self.limiter.slot()
+
+
+search_budget = Budget(
+    "search", SEARCH_RATE_LIMIT, SEARCH_RATE_BURST, SEARCH_MAX_CONCURRENCY, SEARCH_MAX_QUEUE, SEARCH_QUEUE_TIMEOUT
+)
+index_budget = Budget(
+    "index", INDEX_RATE_LIMIT, INDEX_RATE_BURST, INDEX_MAX_CONCURRENCY, INDEX_MAX_QUEUE, INDEX_QUEUE_TIMEOUT
+)
+# Exports keep their slot for as long as they stream, so they do not take the slots of the searches
+export_limiter = ConcurrencyLimiter("export", EXPORT_MAX_CONCURRENCY, EXPORT_MAX_QUEUE, EXPORT_QUEUE_TIMEOUT)
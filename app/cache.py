@@ -0,0 +1,153 @@
+import asyncio
+import math
+import time
+
+from collections import OrderedDict
+from fastapi_cache.backends import Backend
+from app.config import LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_MAX_BYTES, LOCAL_CACHE_TTL
+from app.metrics import CACHE_LOOKUPS, LOCAL_CACHE_EVICTIONS
+from app.tracing import span
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU of encoded responses, each with its own TTL.
+
+    The least recently used entries are evicted once the cache holds more than `max_entries`
+    entries or more than `max_bytes` bytes. Entries live at most `ttl` seconds, so the
+    workers never serve a response much older than the one in Redis.
+    """
+    def __init__(self, max_entries: int = LOCAL_CACHE_MAX_ENTRIES, max_bytes: int = LOCAL_CACHE_MAX_BYTES,
+                 ttl: int = LOCAL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_with_ttl(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            remaining = expires_at - time.monotonic()
+            if remaining > 0:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return math.ceil(remaining), value
+            self.pop(key)
+
+        self.misses += 1
+        return 0, None
+
+    def set(self, key: str, value, expire: int = None):
+        self.pop(key)
+
+        ttl = min(expire, self.ttl) if expire else self.ttl
+        if ttl <= 0 or len(value) > self.max_bytes:
+            return
+
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.size += len(value)
+
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+            LOCAL_CACHE_EVICTIONS.inc()
+
+    def pop(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def clear(self, prefix: str = None):
+        keys = [key for key in self.entries if prefix is None or key.startswith(prefix)]
+        for key in keys:
+            self.pop(key)
+        return len(keys)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class TieredBackend(Backend):
+    """
+    fastapi-cache backend reading from a `LocalCache` before the shared `remote` backend (Redis).
+
+    Entries found in Redis are copied to the local tier, so hot searches are then served
+    without any network hop. Writes and invalidations go to both tiers.
+    """
+    def __init__(self, remote: Backend, local: LocalCache = None):
+        self.remote = remote
+        self.local = local or LocalCache()
+        self.remote_hits = 0
+        self.remote_misses = 0
+
+    async def get_with_ttl(self, key: str):
+        ttl, value = self.local.get_with_ttl(key)
+        if value is not None:
+            CACHE_LOOKUPS.labels("local", "hit").inc()
+            return ttl, value
+
+        CACHE_LOOKUPS.labels("local", "miss").inc()
+        with span("cache.remote_lookup"):
+            ttl, value = await self.remote.get_with_ttl(key)
+        if value is None:
+            self.remote_misses += 1
+            CACHE_LOOKUPS.labels("remote", "miss").inc()
+            return ttl, value
+
+        self.remote_hits += 1
+        CACHE_LOOKUPS.labels("remote", "hit").inc()
+        # Redis answers -1 for keys without expiry
+        self.local.set(key, value, ttl if ttl > 0 else None)
+        return ttl, value
+
+    async def get(self, key: str):
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value, expire: int = None):
+        self.local.set(key, value, expire)
+        await self.remote.set(key, value, expire)
+
+    async def clear(self, namespace: str = None, key: str = None):
+        if namespace:
+            self.local.clear(f"{namespace}:")
+        elif key:
+            self.local.pop(key)
+
+        return await self.remote.clear(namespace, key)
+
+    def stats(self):
+        return {"local": self.local.stats(), "remote": {"hits": self.remote_hits, "misses": self.remote_misses}}
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls sharing a key: the first caller runs the call and the others
+    wait for its result, so identical cache misses cost a single Elasticsearch query.
+    """
+    def __init__(self):
+        self.calls = {}
+        self.coalesced = 0
+
+    async def run(self, key, call):
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self.calls[key] = future
+            future.add_done_callback(lambda _: self.calls.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        # A caller going away (e.g. a client disconnecting) must not cancel the call for the others
+        return await asyncio.shield(future)
@@ -19,4 +19,111 @@ else:
 
 INDEX_NAME = os.getenv("INDEX_NAME", "default_index")
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
\ No newline at end of file
+# Index settings
+ES_NUMBER_OF_SHARDS = int(os.getenv("ES_NUMBER_OF_SHARDS", "1"))
+ES_NUMBER_OF_REPLICAS = int(os.getenv("ES_NUMBER_OF_REPLICAS", "1"))
+ES_REFRESH_INTERVAL = os.getenv("ES_REFRESH_INTERVAL", "1s")
+
+# Async Elasticsearch connection pool
+ES_MAX_CONNECTIONS = int(os.getenv("ES_MAX_CONNECTIONS", "100"))  # Pooled connections per node
+ES_HTTP_COMPRESS = os.getenv("ES_HTTP_COMPRESS", "True") == "True"  # Gzip request and response bodies
+ES_REQUEST_TIMEOUT = float(os.getenv("ES_REQUEST_TIMEOUT", "10"))  # Seconds per request
+ES_CONNECT_RETRIES = int(os.getenv("ES_CONNECT_RETRIES", "10"))  # Startup pings before giving up
+ES_CONNECT_BACKOFF = float(os.getenv("ES_CONNECT_BACKOFF", "0.5"))  # Base delay (seconds) between startup pings
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Last successful result of every search (cursor pages excepted), served while Elasticsearch is unreachable
+STALE_SEARCH_TTL = int(os.getenv("STALE_SEARCH_TTL", "3600"))  # Seconds, also bounds the copies kept to an hour of searches
+
+# JWT verification
+JWT_JWKS_FILE = os.getenv("JWT_JWKS_FILE")  # JWKS of the public keys (RS256, EdDSA...), instead of SECRET_KEY
+JWT_JWKS_REFRESH = float(os.getenv("JWT_JWKS_REFRESH", "60"))  # Seconds between checks of the JWKS file for rotated keys
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))  # Verified tokens kept per worker
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "300"))  # Maximum seconds a valid token is trusted without verification
+JWT_NEGATIVE_CACHE_TTL = int(os.getenv("JWT_NEGATIVE_CACHE_TTL", "30"))  # Seconds an invalid token is remembered
+
+# OpenTelemetry tracing (requires the opentelemetry-sdk package)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "False") == "True"
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "otlp")  # "otlp" (to OTEL_EXPORTER_OTLP_ENDPOINT) or "console"
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))  # Share of the traces started here that are kept
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "fastapi-elasticsearch")
+
+# Idempotency-Key handling
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", "600"))  # Seconds a response is replayed
+IDEMPOTENCY_LOCK_TTL = int(os.getenv("IDEMPOTENCY_LOCK_TTL", "300"))  # Seconds a key stays claimed by a running request
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", str(1024 * 1024)))  # Larger responses are not stored
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "30"))  # Seconds a repeat waits for the first request
+
+# Slow search log (per worker, listed by GET /api/v1/admin/slow-queries)
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "1000"))  # Searches slower than this are recorded
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))  # Latest slow searches kept
+SLOW_QUERY_PROFILE_RATIO = float(os.getenv("SLOW_QUERY_PROFILE_RATIO", "0"))  # Share of the slow searches re-run with `profile: true`
+
+# Hits a search counts exactly, past which `total_results` is a lower bound (-1 counts them all)
+SEARCH_TRACK_TOTAL_HITS = int(os.getenv("SEARCH_TRACK_TOTAL_HITS", "10000"))
+
+# Admission control of the requests reaching Elasticsearch, with separate budgets for /search and /index:
+# requests per second per JWT subject (Redis token bucket, 0 disables it), and per worker, Elasticsearch
+# calls run at once, calls waiting for a slot and seconds they wait before being shed with 503
+SEARCH_RATE_LIMIT = float(os.getenv("SEARCH_RATE_LIMIT", "20"))
+SEARCH_RATE_BURST = int(os.getenv("SEARCH_RATE_BURST", "40"))  # Requests a subject can send at once
+SEARCH_MAX_CONCURRENCY = int(os.getenv("SEARCH_MAX_CONCURRENCY", "32"))
+SEARCH_MAX_QUEUE = int(os.getenv("SEARCH_MAX_QUEUE", "64"))
+SEARCH_QUEUE_TIMEOUT = float(os.getenv("SEARCH_QUEUE_TIMEOUT", "2"))
+INDEX_RATE_LIMIT = float(os.getenv("INDEX_RATE_LIMIT", "0.2"))
+INDEX_RATE_BURST = int(os.getenv("INDEX_RATE_BURST", "5"))
+INDEX_MAX_CONCURRENCY = int(os.getenv("INDEX_MAX_CONCURRENCY", "2"))
+INDEX_MAX_QUEUE = int(os.getenv("INDEX_MAX_QUEUE", "2"))
+INDEX_QUEUE_TIMEOUT = float(os.getenv("INDEX_QUEUE_TIMEOUT", "5"))
+# Exports share the rate limit of /search, but hold their own slots for the whole scan
+EXPORT_MAX_CONCURRENCY = int(os.getenv("EXPORT_MAX_CONCURRENCY", "4"))
+EXPORT_MAX_QUEUE = int(os.getenv("EXPORT_MAX_QUEUE", "4"))
+EXPORT_QUEUE_TIMEOUT = float(os.getenv("EXPORT_QUEUE_TIMEOUT", "2"))
+
+# Searches accepted in one /search/batch request
+SEARCH_BATCH_MAX_SIZE = int(os.getenv("SEARCH_BATCH_MAX_SIZE", "50"))
+
+# Seconds a worker reuses the search cache generation before reading it again from Redis
+SEARCH_GENERATION_REFRESH = float(os.getenv("SEARCH_GENERATION_REFRESH", "1"))
+
+# In-process cache tier in front of Redis (per worker)
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "1024"))  # Cached responses
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # Encoded bytes
+LOCAL_CACHE_TTL = int(os.getenv("LOCAL_CACHE_TTL", "30"))  # Maximum seconds a response is kept locally
+
+# Bulk indexing (Elasticsearch `_bulk` API)
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))  # Max documents per bulk request
+BULK_MAX_CHUNK_BYTES = int(os.getenv("BULK_MAX_CHUNK_BYTES", str(10 * 1024 * 1024)))  # Max bytes per bulk request
+BULK_DISABLE_REFRESH = os.getenv("BULK_DISABLE_REFRESH", "False") == "True"  # Disable refresh during the load
+
+# Fingerprints of the indexed movies saved to Redis per HSET, for delta indexing
+FINGERPRINT_FLUSH_SIZE = int(os.getenv("FINGERPRINT_FLUSH_SIZE", "500"))
+
+# Movies per Elasticsearch request (and per streamed chunk) of an export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Versioned indices kept after a reindex besides the one behind the alias (for rollbacks)
+REINDEX_KEEP_VERSIONS = int(os.getenv("REINDEX_KEEP_VERSIONS", "1"))
+
+# External movies API fetching
+MOVIES_API_TIMEOUT = float(os.getenv("MOVIES_API_TIMEOUT", "10"))  # Seconds per request
+MOVIES_API_MAX_WORKERS = int(os.getenv("MOVIES_API_MAX_WORKERS", "8"))  # Pages fetched concurrently
+MOVIES_API_RATE_LIMIT = float(os.getenv("MOVIES_API_RATE_LIMIT", "20"))  # Requests per second per host (0 = unlimited)
+MOVIES_API_MAX_RETRIES = int(os.getenv("MOVIES_API_MAX_RETRIES", "3"))  # Retries on 5xx responses and timeouts
+MOVIES_API_BACKOFF = float(os.getenv("MOVIES_API_BACKOFF", "0.5"))  # Base delay (seconds) of the exponential backoff
+
+# Source of the indexed movies
+MOVIES_SOURCE = os.getenv("MOVIES_SOURCE", "http")  # "http" (external API) or "ndjson" (local dump)
+MOVIES_SOURCE_FILE = os.getenv("MOVIES_SOURCE_FILE")  # NDJSON file of movies read by the "ndjson" source
+MOVIES_SOURCE_PAGE_SIZE = int(os.getenv("MOVIES_SOURCE_PAGE_SIZE", "100"))  # Movies per page of the "ndjson" source
+
+# On-disk cache (SQLite) of the external API pages, disabled without a path
+MOVIES_CACHE_PATH = os.getenv("MOVIES_CACHE_PATH")
+MOVIES_CACHE_TTL = int(os.getenv("MOVIES_CACHE_TTL", "3600"))  # Seconds a page is used before being revalidated (ETag)
+MOVIES_CACHE_MAX_BYTES = int(os.getenv("MOVIES_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # Compressed pages kept
+
+# Background indexing jobs
+INDEX_JOBS_WORKERS = int(os.getenv("INDEX_JOBS_WORKERS", "1"))  # Jobs run concurrently per process
+INDEX_JOBS_REDIS_STATE = os.getenv("INDEX_JOBS_REDIS_STATE", "False") == "True"  # Share job state across workers
+INDEX_JOBS_TTL = int(os.getenv("INDEX_JOBS_TTL", "86400"))  # Seconds a finished job remains queryable
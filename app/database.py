@@ -1,20 +1,79 @@
-import time
+import asyncio
+import logging
 
-from elasticsearch import Elasticsearch
-from app.config import ELASTICSEARCH_URL
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+from app.config import (
+    ELASTICSEARCH_URL, ES_MAX_CONNECTIONS, ES_HTTP_COMPRESS, ES_REQUEST_TIMEOUT,
+    ES_CONNECT_RETRIES, ES_CONNECT_BACKOFF
+)
 from redis import asyncio as aioredis
 from app.config import REDIS_URL
 
-# Retries to wait for Elasticsearch to become available
-for _ in range(10):
-    try:
-        es = Elasticsearch([ELASTICSEARCH_URL])
-        if es.ping():
-            break
-    except Exception as e:
-        time.sleep(5)
-else:
-    raise ValueError("Failed to connect to Elasticsearch")
+logger = logging.getLogger(__name__)
+
+# Clients are created on first use, importing this module never touches the network
+_es = None
+_async_es = None
+
+
+def get_es():
+    """
+    Get the sync Elasticsearch client (used by the tests and maintenance scripts).
+    """
+    global _es
+    if _es is None:
+        _es = Elasticsearch([ELASTICSEARCH_URL])
+    return _es
+
+
+def get_async_es():
+    """
+    Get the async Elasticsearch client used by the API.
+
+    Connections are pooled per node and kept alive between requests, so concurrent
+    searches share up to `ES_MAX_CONNECTIONS` sockets instead of opening new ones.
+    """
+    global _async_es
+    if _async_es is None:
+        _async_es = AsyncElasticsearch(
+            [ELASTICSEARCH_URL],
+            connections_per_node=ES_MAX_CONNECTIONS,
+            http_compress=ES_HTTP_COMPRESS,
+            request_timeout=ES_REQUEST_TIMEOUT,
+            retry_on_timeout=True
+        )
+    return _async_es
+
+
+async def wait_for_elasticsearch(retries: int = ES_CONNECT_RETRIES, backoff: float = ES_CONNECT_BACKOFF):
+    """
+    Ping Elasticsearch until it answers, waiting `backoff * 2 ** attempt` seconds (capped at 30)
+    between attempts. Returns `False` if it is still unreachable after `retries` attempts.
+    """
+    for attempt in range(retries):
+        try:
+            if await get_async_es().ping():
+                return True
+        except Exception:
+            pass
+
+        await asyncio.sleep(min(backoff * 2 ** attempt, 30))
+
+    logger.error(f"Elasticsearch unreachable after {retries} attempts")
+    return False
+
+
+async def close_clients():
+    """
+    Close the connections of the async clients. They are created again on next use.
+    """
+    global _async_es
+    if _async_es is not None:
+        await _async_es.close()
+        _async_es = None
+
+    await redis_client.aclose()
+
 
 # Get redis client
-redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
\ No newline at end of file
+redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
@@ -1,88 +1,598 @@
-import requests
+import asyncio
+import base64
+import json
+import logging
+import time
 
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
 from fastapi import HTTPException
-from app.database import es
-from app.config import INDEX_NAME
+from elasticsearch import BadRequestError, NotFoundError
+from elasticsearch.helpers import async_streaming_bulk
+from starlette.concurrency import iterate_in_threadpool
+from app.database import get_async_es
+from app.config import (
+    INDEX_NAME, BULK_CHUNK_SIZE, BULK_MAX_CHUNK_BYTES, BULK_DISABLE_REFRESH, REINDEX_KEEP_VERSIONS, EXPORT_BATCH_SIZE,
+    MOVIES_API_MAX_WORKERS, SEARCH_TRACK_TOTAL_HITS
+)
+from app import sources
+from app.sources import MovieSource
+from app.metrics import observe_es, query_shape
+from app.slow_queries import slow_query_log
+from app.fingerprints import FingerprintStore, delete_fingerprints
+from app.mappings import MAPPING_VERSION, NGRAM_SIZE, INDEX_SETTINGS, INDEX_MAPPINGS
 from app.models import ErrorResponse
 
-MOVIES_API_URL = "https://jsonmock.hackerrank.com/api/moviesdata/search/"
+logger = logging.getLogger(__name__)
 
-def create_index():
+# Max number of per-item bulk errors returned to the client (`total_failed` holds the full count)
+MAX_REPORTED_ERRORS = 100
+
+# Seconds allowed for the force-merge of a rebuilt index
+FORCEMERGE_TIMEOUT = 600
+
+# Seconds allowed to copy an index created with an older mapping version (see `migrate_index`)
+MIGRATION_TIMEOUT = 1800
+
+# Seconds between two checks of a migration run by another worker
+MIGRATION_POLL_INTERVAL = 1
+
+# Deepest hit reachable with `from`/`size` (Elasticsearch's default `index.max_result_window`)
+MAX_RESULT_WINDOW = 10000
+
+# How long a point in time stays open between two cursor pages
+PIT_KEEP_ALIVE = "1m"
+
+# Buckets returned by the `years` aggregation
+MAX_YEAR_BUCKETS = 200
+
+# Deterministic order (ties broken by `imdbID`), required to continue a search with `search_after`
+SEARCH_SORT = [{"_score": "desc"}, {"imdbID": "asc"}]
+
+# Hits counted exactly by a search (`True` counts them all): past it, the total is a lower bound
+TRACK_TOTAL_HITS = True if SEARCH_TRACK_TOTAL_HITS < 0 else SEARCH_TRACK_TOTAL_HITS
+
+# Parts of a search response read by the app, the rest (`_id`, `_score`, `_index`...) is not sent back
+SEARCH_FILTER_PATH = ["took", "_shards", "pit_id", "hits.total", "hits.hits._source", "hits.hits.sort", "aggregations"]
+MSEARCH_FILTER_PATH = ["took", "responses.status", "responses.error"] + [f"responses.{path}" for path in SEARCH_FILTER_PATH]
+
+# Whether the index behind `INDEX_NAME` exists with the current mappings, reported by `/readyz`
+index_ready = False
+
+
+async def create_index():
+    """
+    Create an index in Elasticsearch if it doesn't exist, with the explicit settings and mappings
+    of `app.mappings`. An existing index created with an older mapping version is migrated first.
+
+    `INDEX_NAME` is an alias pointing to a versioned index (`<INDEX_NAME>_v<N>`), so the
+    catalog can later be rebuilt and swapped without downtime (see `reindex_movies`).
+    """
+    global index_ready
+    es = get_async_es()
+
+    if not await es.indices.exists(index=INDEX_NAME):
+        await es.indices.create(
+            index=await next_index_name(),
+            settings=INDEX_SETTINGS,
+            mappings=INDEX_MAPPINGS,
+            aliases={INDEX_NAME: {}}
+        )
+        index_ready = True
+        return
+
+    version = await mapping_version()
+    if version < MAPPING_VERSION:
+        await migrate_index(version)
+
+    index_ready = True
+
+
+async def mapping_version():
     """
-    Create an index in Elasticsearch if it doesn't exist
+    Mapping version of the index behind `INDEX_NAME` (0 for an index created without `_meta`).
     """
-    if not es.indices.exists(index=INDEX_NAME):
-        es.indices.create(index=INDEX_NAME)
+    mappings = await get_async_es().indices.get_mapping(index=INDEX_NAME)
+    return next(iter(mappings.values()), {}).get("mappings", {}).get("_meta", {}).get("version", 0)
 
 
-def fetch_movies_from_api(title: str, page: int):
+async def migrate_index(version: int):
     """
-    Fetch movies from the Hackerrank external API.
+    Copy the movies of an index created with an older mapping version into a new versioned index
+    with the current mappings, inside Elasticsearch (`_reindex`), then swap the alias to it.
+
+    Searches rely on the current mappings (`Title.ngram` for substrings, `imdbID` as a keyword to
+    sort on), so on an older index they miss or fail until it is migrated. When several workers
+    start at once, the one creating the new index migrates it and the others wait for the swap.
     """
-    url = f"{MOVIES_API_URL}?Title={title}&page={page}"
+    es = get_async_es()
+    new_index = await next_index_name()
+    logger.warning(f"Index {INDEX_NAME} uses mapping version {version}, migrating it to {new_index}")
 
     try:
-        response = requests.get(url, timeout=10)  # Set a timeout to avoid hanging requests
-        response.raise_for_status()  # Raise an error for HTTP 4xx/5xx status codes
+        await es.indices.create(
+            index=new_index,
+            settings={**INDEX_SETTINGS, "number_of_replicas": 0, "refresh_interval": "-1"},
+            mappings=INDEX_MAPPINGS
+        )
+    except BadRequestError as e:
+        if e.error != "resource_already_exists_exception":
+            raise
+        await wait_for_migration()
+        return
 
-        return response.json()
+    try:
+        await es.options(request_timeout=MIGRATION_TIMEOUT).reindex(
+            source={"index": INDEX_NAME}, dest={"index": new_index}, wait_for_completion=True, refresh=True
+        )
+        await es.indices.put_settings(index=new_index, settings={"index": {
+            "number_of_replicas": INDEX_SETTINGS["number_of_replicas"],
+            "refresh_interval": INDEX_SETTINGS["refresh_interval"]
+        }})
+    except Exception:
+        await es.indices.delete(index=new_index, ignore_unavailable=True)
+        raise
 
-    except requests.Timeout:
-        raise HTTPException(
-            status_code=504,
-            detail={"code": "EXTERNAL_API_TIMEOUT", "message": "The external API request timed out."}
-        ) from None
+    await swap_alias(new_index)
+    await delete_old_indices()
+    logger.info(f"Alias {INDEX_NAME} now points to {new_index}, migrated to mapping version {MAPPING_VERSION}")
 
-    except requests.RequestException as e:
-        raise HTTPException(
-            status_code=502,
-            detail={"code": "EXTERNAL_API_ERROR", "message": f"Error getting data from external API: {str(e)}"}
-        ) from None
+
+async def wait_for_migration(timeout: float = MIGRATION_TIMEOUT):
+    """
+    Wait until another worker has swapped `INDEX_NAME` to an index with the current mappings.
+    """
+    deadline = time.monotonic() + timeout
+    while await mapping_version() < MAPPING_VERSION:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Index {INDEX_NAME} was not migrated to mapping version {MAPPING_VERSION} in time")
+        await asyncio.sleep(MIGRATION_POLL_INTERVAL)
 
 
-def index_movies(title: str = "", page: int = 1):
+def fetch_movies_from_api(title: str, page: int, source: MovieSource = None):
     """
-    Gets movies from external API and indexes them in Elasticsearch.
+    Fetch a page of movies for `title` from `source`, by default the configured one (`app.sources.movie_source`).
+    """
+    return (source or sources.movie_source).fetch_page(title, page)
+
+
+def fetch_movie_pages(title: str = "", page: int = 1, source: MovieSource = None):
+    """
+    Yield the pages of `source` (see `fetch_movies_from_api`) for `title`, starting at `page`.
+
+    The first page is fetched on its own to learn `total_pages`, the remaining pages are fetched
+    concurrently by up to `MOVIES_API_MAX_WORKERS` threads and yielded as soon as each one arrives
+    (not in page order). At most `MOVIES_API_MAX_WORKERS` pages are in flight at once, so a slow
+    consumer does not make the fetched pages pile up in memory. Each fetch runs in a copy of the
+    caller's context, so its span is a child of the caller's one.
+    """
+    data = fetch_movies_from_api(title, page, source)
+
+    if not data["data"]:  # If there are no movies, there is nothing else to fetch
+        return
+
+    yield data
+
+    pending_pages = iter(range(page + 1, data["total_pages"] + 1))
+    executor = ThreadPoolExecutor(max_workers=MOVIES_API_MAX_WORKERS)
+
+    try:
+        in_flight = {
+            executor.submit(copy_context().run, fetch_movies_from_api, title, next_page, source)
+            for next_page in islice(pending_pages, MOVIES_API_MAX_WORKERS)
+        }
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                data = future.result()
+
+                for next_page in islice(pending_pages, 1):
+                    in_flight.add(executor.submit(copy_context().run, fetch_movies_from_api, title, next_page, source))
+
+                if data["data"]:
+                    yield data
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_movie_doc(movie: dict):
+    """
+    Transform a movie from the external API into the document stored in Elasticsearch.
+    """
+    return {
+        "Title": movie["Title"],
+        "Year": int(movie["Year"]),
+        "imdbID": movie["imdbID"]
+    }
+
+
+async def generate_movie_actions(title: str = "", page: int = 1, progress=None, index: str = INDEX_NAME,
+                                 fingerprints: FingerprintStore = None, source: MovieSource = None):
+    """
+    Yield one bulk `index` action per movie, as the pages arrive from the external API.
+
+    Pages are fetched in the threadpool and only requested when the bulk helper needs more
+    documents, so memory stays bounded by the chunk size instead of the whole crawl.
+    The crawl stops early once `progress.cancelled` is set. With `fingerprints`, only the
+    movies it reports as changed are yielded.
+    """
+    pages = fetch_movie_pages(title, page, source)
+
+    try:
+        async for data in iterate_in_threadpool(pages):
+            if progress:
+                if progress.cancelled:
+                    return
+                progress.page_fetched(data["total_pages"])
+
+            movie_docs = [build_movie_doc(movie) for movie in data["data"]]
+            if fingerprints:
+                movie_docs = await fingerprints.changed(movie_docs)
+
+            for movie_doc in movie_docs:
+                yield {"_index": index, "_id": movie_doc["imdbID"], "_source": movie_doc}
+    finally:
+        pages.close()  # Stop the page fetchers still in flight
+
+
+async def disable_refresh():
+    """
+    Disable periodic refreshes on the index.
+    """
+    await get_async_es().indices.put_settings(index=INDEX_NAME, settings={"index": {"refresh_interval": "-1"}})
+
+
+async def restore_refresh():
+    """
+    Restore the configured `refresh_interval` and make the loaded documents searchable.
+
+    The configured value is written rather than the one read before the load: a load starting while
+    another one has refreshes disabled would otherwise save and restore `-1`, leaving them disabled.
+    """
+    await get_async_es().indices.put_settings(
+        index=INDEX_NAME, settings={"index": {"refresh_interval": INDEX_SETTINGS["refresh_interval"]}}
+    )
+    await get_async_es().indices.refresh(index=INDEX_NAME)
+
+
+class ObservedBulkClient:
+    """
+    The Elasticsearch client as seen by `async_streaming_bulk`, observing each `_bulk` request it
+    sends (see `observe_es`) rather than the whole load, which lasts as long as the source is read.
+    """
+    def __init__(self, es, index: str):
+        self.es = es
+        self.index = index
+
+    def options(self, **kwargs):
+        return ObservedBulkClient(self.es.options(**kwargs), self.index)
+
+    @property
+    def transport(self):
+        return self.es.transport
+
+    @property
+    def _client_meta(self):
+        return self.es._client_meta
+
+    @_client_meta.setter
+    def _client_meta(self, value):
+        self.es._client_meta = value
+
+    async def bulk(self, operations: list, **kwargs):
+        # Every action sent by `generate_movie_actions` is followed by its document
+        return await observe_es(
+            "bulk", self.es.bulk(operations=operations, **kwargs), index=self.index, documents=len(operations) // 2
+        )
+
+
+async def bulk_load_movies(index: str, title: str = "", page: int = 1, progress=None,
+                           fingerprints: FingerprintStore = None, source: MovieSource = None):
+    """
+    Stream the movies of `source` (by default the external API) into `index` through the `_bulk` API.
+
+    Documents are sent in chunks of `BULK_CHUNK_SIZE` documents or `BULK_MAX_CHUNK_BYTES` bytes,
+    whichever is reached first. Items rejected by Elasticsearch do not abort the load, they are
+    counted in `total_failed` and reported in `errors` (up to `MAX_REPORTED_ERRORS`).
+
+    The fingerprints of the written movies are saved to `fingerprints` (skipping the unchanged
+    ones when it is in delta mode). Written movies are counted as `created` or `updated`
+    according to Elasticsearch, skipped ones as `unchanged`.
+    """
+    total_indexed = 0
+    total_failed = 0
+    created = 0
+    errors = []
+    fingerprints = fingerprints or FingerprintStore(index, skip_unchanged=False)
+
+    async for ok, item in async_streaming_bulk(
+        ObservedBulkClient(get_async_es(), index),
+        generate_movie_actions(title, page, progress, index, fingerprints, source),
+        chunk_size=BULK_CHUNK_SIZE,
+        max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+        raise_on_error=False
+    ):
+        result = item.get("index", {})
+        await fingerprints.written(result.get("_id"), ok)
+
+        if progress:
+            progress.document_indexed(ok)
+
+        if ok:
+            total_indexed += 1
+            created += result.get("status") == 201
+            continue
+
+        total_failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({
+                "imdbID": str(result.get("_id")),
+                "status": result.get("status", 500),
+                "error": str(result.get("error"))
+            })
+
+    await fingerprints.flush()
+
+    return {
+        "total_indexed": total_indexed,
+        "total_failed": total_failed,
+        "created": created,
+        "updated": total_indexed - created,
+        "unchanged": fingerprints.unchanged,
+        "errors": errors
+    }
+
+
+async def live_index():
+    """
+    Name of the concrete index behind the `INDEX_NAME` alias (`INDEX_NAME` itself if it is not an alias).
+    """
+    try:
+        aliases = await get_async_es().indices.get_alias(name=INDEX_NAME)
+    except NotFoundError:
+        return INDEX_NAME
+    return next(iter(aliases), INDEX_NAME)
+
+
+async def index_movies(title: str = "", page: int = 1, progress=None, delta: bool = False, source: MovieSource = None):
+    """
+    Gets movies from external API and indexes them in Elasticsearch using the `_bulk` API.
 
     - `title`: (str) Title substring to search for movies (required).
     - `page`: (int) Home page (optional, defaults to `1`).
     If not provided, will loop through all available pages.
+    - `progress`: (optional) Object notified of the crawl progress through `page_fetched(total_pages)`
+    and `document_indexed(ok)`, and polled through its `cancelled` attribute (see `app.jobs.IndexJob`).
+    - `delta`: (bool) Only write the movies whose fingerprint (`Title` and `Year`) differs from the one
+    saved by the previous loads of the index, so repeated crawls barely write to Elasticsearch.
+    - `source`: (optional) `MovieSource` to read the movies from instead of the configured one.
+
+    The movies are written in place into the index behind `INDEX_NAME` (see `bulk_load_movies`).
+    When `BULK_DISABLE_REFRESH` is enabled, refreshes are turned off during the load and a
+    single refresh is issued at the end.
     """
-    all_movies = []
-    total_pages = None
+    await create_index()
 
-    create_index()
+    fingerprints = FingerprintStore(await live_index(), skip_unchanged=delta)
+    if BULK_DISABLE_REFRESH:
+        await disable_refresh()
 
-    while True:
-        data = fetch_movies_from_api(title, page)
+    try:
+        result = await bulk_load_movies(INDEX_NAME, title, page, progress, fingerprints, source)
+    finally:
+        if BULK_DISABLE_REFRESH:
+            await restore_refresh()
 
-        if not data["data"]:  # If there are no more movies, we exit the loop
-            break
+    return {"status": "Movies indexed" if not result["total_failed"] else "Movies indexed with errors", **result}
 
-        # We save `total_pages` in the first iteration
-        if total_pages is None:
-            total_pages = data["total_pages"]
 
-        for movie in data["data"]:
-            movie_doc = {
-                "Title": movie["Title"],
-                "Year": int(movie["Year"]),
-                "imdbID": movie["imdbID"]
-            }
-            all_movies.append(movie_doc)
+def versioned_index_name(version: int):
+    return f"{INDEX_NAME}_v{version}"
 
-            # Index each document in Elasticsearch
-            es.index(index=INDEX_NAME, id=movie["imdbID"], document=movie_doc)
 
-        # If the user specified `page`, we only process that page and are done
-        if total_pages and page >= total_pages:
-            break
+async def get_index_versions():
+    """
+    Map the version number of every `<INDEX_NAME>_v<N>` index to its name.
+    """
+    indices = await get_async_es().indices.get_alias(index=f"{INDEX_NAME}_v*")
+
+    versions = {}
+    for name in indices:
+        suffix = name[len(INDEX_NAME) + 2:]
+        if suffix.isdigit():
+            versions[int(suffix)] = name
+
+    return versions
+
 
-        page += 1  # next page
+async def next_index_name():
+    versions = await get_index_versions()
+    return versioned_index_name(max(versions, default=0) + 1)
 
-    return {"status": "Movies indexed", "total_indexed": len(all_movies)}
 
-def search_movies(title: str = None, year: int = None, page: int = 1, size: int = 10):
+async def swap_alias(new_index: str):
+    """
+    Atomically point the `INDEX_NAME` alias to `new_index`. A concrete index created under
+    `INDEX_NAME` before versioned indices existed is deleted in the same operation.
+    """
+    es = get_async_es()
+    actions = []
+
+    if await es.indices.exists_alias(name=INDEX_NAME):
+        current = await es.indices.get_alias(name=INDEX_NAME)
+        actions += [{"remove": {"index": name, "alias": INDEX_NAME}} for name in current]
+    elif await es.indices.exists(index=INDEX_NAME):
+        actions.append({"remove_index": {"index": INDEX_NAME}})
+
+    actions.append({"add": {"index": new_index, "alias": INDEX_NAME}})
+
+    await es.indices.update_aliases(actions=actions)
+
+
+async def delete_old_indices(keep: int = REINDEX_KEEP_VERSIONS):
+    """
+    Delete the versioned indices no longer behind the alias, except the `keep` most recent ones
+    (kept to roll back by pointing the alias to them again). Returns the deleted names.
+    """
+    es = get_async_es()
+    versions = await get_index_versions()
+    live = await es.indices.get_alias(name=INDEX_NAME)
+
+    old = [name for _, name in sorted(versions.items(), reverse=True) if name not in live]
+    for name in old[keep:]:
+        await es.indices.delete(index=name)
+        await delete_fingerprints(name)
+
+    return old[keep:]
+
+
+async def reindex_movies(title: str = "", page: int = 1, progress=None, source: MovieSource = None):
+    """
+    Rebuild the catalog in a new versioned index and swap the `INDEX_NAME` alias to it.
+
+    Searches keep reading the current index until the swap, so they never see a half-loaded
+    catalog nor pay for the load:
+    1. create `<INDEX_NAME>_v<N+1>` without replicas and with refreshes disabled,
+    2. bulk-load every movie fetched for `title` from `page`,
+    3. refresh, force-merge into a single segment, then restore the replicas (they copy
+       the merged segments) and the refresh interval,
+    4. atomically swap the alias and delete the versions older than `REINDEX_KEEP_VERSIONS`.
+
+    The new index is dropped, and the alias left untouched, if the load fails, is cancelled
+    through `progress`, or fetched no movies.
+    """
+    es = get_async_es()
+    new_index = await next_index_name()
+
+    await es.indices.create(
+        index=new_index,
+        settings={**INDEX_SETTINGS, "number_of_replicas": 0, "refresh_interval": "-1"},
+        mappings=INDEX_MAPPINGS
+    )
+
+    try:
+        result = await bulk_load_movies(new_index, title, page, progress, source=source)
+
+        cancelled = progress is not None and progress.cancelled
+        if cancelled or not result["total_indexed"]:
+            await es.indices.delete(index=new_index)
+            await delete_fingerprints(new_index)
+            status = "Reindex cancelled" if cancelled else "Reindex aborted, no movies fetched"
+            return {"status": status, **result}
+
+        await es.indices.refresh(index=new_index)
+        await es.options(request_timeout=FORCEMERGE_TIMEOUT).indices.forcemerge(index=new_index, max_num_segments=1)
+        await es.indices.put_settings(index=new_index, settings={"index": {
+            "number_of_replicas": INDEX_SETTINGS["number_of_replicas"],
+            "refresh_interval": INDEX_SETTINGS["refresh_interval"]
+        }})
+    except Exception:
+        await es.indices.delete(index=new_index, ignore_unavailable=True)
+        await delete_fingerprints(new_index)
+        raise
+
+    await swap_alias(new_index)
+    deleted = await delete_old_indices()
+    logger.info(f"Alias {INDEX_NAME} now points to {new_index}, deleted old indices: {deleted}")
+
+    return {"status": "Movies reindexed", "index": new_index, **result}
+
+
+def escape_wildcard(value: str):
+    return value.replace("\\", "\\\\").replace("*", "\\*").replace("?", "\\?")
+
+
+def build_search_query(title: str = None, year: int = None):
+    """
+    Build the Elasticsearch query shared by every search.
+
+    - `title` is matched as a substring through the `Title.ngram` subfield: a phrase of the title's
+    grams, looked up as a few terms instead of scanning the whole term dictionary like a leading
+    wildcard does. Titles shorter than `NGRAM_SIZE` have no grams and fall back to a wildcard on `Title.keyword`.
+    An index created without the subfield would match nothing: it is migrated on startup (see `create_index`).
+    - `year` is applied in filter context (no scoring, cacheable by Elasticsearch).
+    """
+    query = {"bool": {"must": [], "filter": []}}
+
+    if title and len(title) >= NGRAM_SIZE:
+        query["bool"]["must"].append({"match_phrase": {"Title.ngram": title}})
+    elif title:
+        query["bool"]["must"].append({
+            "wildcard": {"Title.keyword": {"value": f"*{escape_wildcard(title)}*", "case_insensitive": True}}
+        })
+
+    if year:
+        query["bool"]["filter"].append({"term": {"Year": year}})
+
+    return query
+
+
+def build_search_aggs(aggs: list = None):
+    """
+    Build the Elasticsearch aggregations requested on a search:
+
+    - `years`: number of movies per year.
+    - `decades`: number of movies per decade (histogram of `Year` by 10).
+    - `year_range`: oldest and newest year.
+    """
+    body = {}
+
+    for name in aggs or []:
+        if name == "years":
+            body["years"] = {"terms": {"field": "Year", "size": MAX_YEAR_BUCKETS, "order": {"_key": "asc"}}}
+        elif name == "decades":
+            body["decades"] = {"histogram": {"field": "Year", "interval": 10, "min_doc_count": 1}}
+        elif name == "year_range":
+            body["min_year"] = {"min": {"field": "Year"}}
+            body["max_year"] = {"max": {"field": "Year"}}
+
+    return body
+
+
+def parse_aggregations(aggregations: dict):
+    """
+    Convert the aggregations of a search response to the fields of `MovieAggregations` (`None` when not requested).
+    """
+    result = {"years": None, "decades": None, "min_year": None, "max_year": None}
+
+    for name in ("years", "decades"):
+        if name in aggregations:
+            result[name] = [{"key": int(b["key"]), "count": b["doc_count"]} for b in aggregations[name]["buckets"]]
+
+    for name in ("min_year", "max_year"):
+        if name in aggregations:
+            value = aggregations[name]["value"]
+            result[name] = int(value) if value is not None else None
+
+    return result
+
+
+def encode_cursor(state: dict):
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str, title: str = None, year: int = None):
+    """
+    Decode a cursor returned in `next_cursor`, checking it belongs to the same search.
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        valid = state["title"] == title and state["year"] == year
+    except (ValueError, TypeError, KeyError):
+        valid = False
+
+    if not valid:
+        error = ErrorResponse(code="INVALID_CURSOR", message="The cursor is invalid or belongs to another search.")
+        raise HTTPException(status_code=400, detail=error.model_dump())
+
+    return state
+
+
+async def search_movies(title: str = None, year: int = None, page: int = 1, size: int = 10, cursor: str = None,
+                        aggs: list = None, fields: list = None):
     """
     Search movies in Elasticsearch with pagination.
 
@@ -90,27 +600,247 @@ def search_movies(title: str = None, year: int = None, page: int = 1, size: int
 - `year` (optional): Filter by exact year.
 - `page` (optional, default 1): Page of results (1-indexed).
 - `size` (optional, default 10): Number of results per page.
+- `cursor` (optional): `next_cursor` of the previous page, to paginate beyond `MAX_RESULT_WINDOW`.
+- `aggs` (optional): Aggregations computed over every match in the same request (see `build_search_aggs`).
+  Ignored with `cursor`. With `size=0` only the aggregations are returned.
+- `fields` (optional): Fields of the movies to return (all of them by default).
+
+    Pages are read with `from`/`size`, which costs Elasticsearch `from + size` hits per shard and
+    is refused past `MAX_RESULT_WINDOW`. Every response with more results carries a `next_cursor`:
+    following it opens a point in time and continues with `search_after`, whose cost does not
+    grow with the depth of the page.
+
+    Searches slower than `SLOW_QUERY_THRESHOLD_MS` are recorded in `slow_query_log`, cursor pages included.
+
+    Elasticsearch only sends back what the result is built from (see `search_body` and
+    `SEARCH_FILTER_PATH`), and caches the searches without a title in its shard request cache.
     """
-    query = {"bool": {"must": []}}
+    query = build_search_query(title, year)
 
-    if title:
-        query["bool"]["must"].append({
-            "query_string": {
-                "query": f"*{title}*",
-                "default_field": "Title"
-            }
-        })
+    if cursor:
+        return await search_movies_after(query, decode_cursor(cursor, title, year), size, fields)
 
-    if year:
-        query["bool"]["must"].append({"term": {"Year": year}})
+    body = search_body(query, page_offset(page, size), size, aggs, fields)
+
+    start = time.perf_counter()
+    response = await observe_es("search", get_async_es().search(
+        index=INDEX_NAME, body=body, filter_path=SEARCH_FILTER_PATH, request_cache=request_cache(title, size)
+    ), **query_shape(body))
+
+    slow_query_log.record(
+        "search", body, {"title": title, "year": year, "page": page, "size": size, "aggs": aggs, "fields": fields},
+        time.perf_counter() - start, response
+    )
+
+    return search_result(response, title, year, page, size)
+
+
+def search_body(query: dict, from_value: int, size: int, aggs: list = None, fields: list = None):
+    """
+    Request body of a page of search results:
+
+    - `_source` is restricted to `fields` when given, so only the requested fields are read and sent.
+    - Hits are counted up to `TRACK_TOTAL_HITS` instead of exactly.
+    """
+    body = {"query": query, "from": from_value, "size": size, "sort": SEARCH_SORT, "track_total_hits": TRACK_TOTAL_HITS}
+
+    if fields:
+        body["_source"] = fields
+
+    aggs_body = build_search_aggs(aggs)
+    if aggs_body:
+        body["aggs"] = aggs_body
+
+    return body
+
+
+def request_cache(title: str, size: int):
+    """
+    Whether Elasticsearch may serve a search from its shard request cache (invalidated on each refresh):
+    aggregation-only searches (`size=0`) and filter-only ones (no title), which repeat the most.
+    """
+    return size == 0 or not title
+
+
+async def msearch_movies(searches: list):
+    """
+    Run several searches (dicts of `title`, `year`, `page`, `size`, `aggs` and `fields`) in a single `_msearch` request.
+
+    Results are returned in the order of `searches`, in the format of `search_movies`.
+    """
+    body = []
+    for search in searches:
+        body.append({"index": INDEX_NAME, "request_cache": request_cache(search["title"], search["size"])})
+        body.append(search_body(
+            build_search_query(search["title"], search["year"]), page_offset(search["page"], search["size"]),
+            search["size"], search.get("aggs"), search.get("fields")
+        ))
+
+    response = await observe_es(
+        "msearch", get_async_es().msearch(searches=body, filter_path=MSEARCH_FILTER_PATH), **query_shape(*body[1::2])
+    )
+
+    results = []
+    for search, item in zip(searches, response["responses"]):
+        if "error" in item:
+            reason = item["error"].get("reason", item["error"]) if isinstance(item["error"], dict) else item["error"]
+            error = ErrorResponse(code="SEARCH_FAILED", message=f"Search for '{search['title']}' failed: {reason}")
+            raise HTTPException(status_code=item.get("status", 500), detail=error.model_dump())
+
+        results.append(search_result(item, search["title"], search["year"], search["page"], search["size"]))
+
+    return results
+
+
+def page_offset(page: int, size: int):
+    """
+    Offset of a page read with `from`/`size`, refused past `MAX_RESULT_WINDOW`.
+    """
+    from_value = (page - 1) * size
+
+    if from_value + size > MAX_RESULT_WINDOW:
+        raise_page_too_deep()
+
+    return from_value
+
+
+def raise_page_too_deep():
+    error = ErrorResponse(
+        code="PAGE_TOO_DEEP",
+        message=f"Pages beyond {MAX_RESULT_WINDOW} results must be fetched with the `next_cursor` of the previous page."
+    )
+    raise HTTPException(status_code=400, detail=error.model_dump())
+
+
+def search_result(response, title: str, year: int, page: int, size: int):
+    """
+    Build the result of a page read with `from`/`size`, with a `next_cursor` if more results exist.
 
+    The cursor resumes at the `from` offset of the next page while it stays within `MAX_RESULT_WINDOW`,
+    and past it `search_after` the sort values of the last hit.
+    """
     from_value = (page - 1) * size
+    total = response["hits"]["total"]
+    hits = response["hits"].get("hits", [])  # Left out by `filter_path` when empty
+
+    # Past `TRACK_TOTAL_HITS` the total is a lower bound (`gte`): a full page means there may be more
+    more = from_value + len(hits) < total["value"] or (total.get("relation") == "gte" and len(hits) == size)
 
-    response = es.search(index=INDEX_NAME, query=query, from_=from_value, size=size)
+    next_cursor = None
+    if hits and more:
+        next_from = from_value + len(hits)
+        within_window = next_from + size <= MAX_RESULT_WINDOW
+        next_cursor = encode_cursor({
+            "title": title, "year": year, "page": page + 1, "pit": None,
+            "from": next_from if within_window else None, "after": None if within_window else hits[-1]["sort"]
+        })
 
     return {
-        "movies": [hit["_source"] for hit in response["hits"]["hits"]],
-        "total_results": response["hits"]["total"]["value"],
+        "movies": [hit["_source"] for hit in hits],
+        "total_results": total["value"],
+        "total_relation": total.get("relation", "eq"),
         "page": page,
-        "size": size
-    }
\ No newline at end of file
+        "size": size,
+        "next_cursor": next_cursor,
+        "aggregations": parse_aggregations(response["aggregations"]) if "aggregations" in response else None
+    }
+
+
+async def search_movies_after(query: dict, state: dict, size: int, fields: list = None):
+    """
+    Fetch the page following a cursor inside a point in time (PIT), so the pages stay consistent
+    while the index changes. The PIT is opened by the first cursor (which starts at the `from` offset
+    of the page it comes from, or after its last hit near `MAX_RESULT_WINDOW`), then each page continues with `search_after` the sort values of the
+    last hit. The PIT is closed once the last page is reached.
+    """
+    # Elasticsearch enforces `MAX_RESULT_WINDOW` on `from` inside a PIT too (e.g. for a larger `size`)
+    if not state["after"] and state["from"] + size > MAX_RESULT_WINDOW:
+        raise_page_too_deep()
+
+    es = get_async_es()
+    pit_id = state["pit"] or (await es.open_point_in_time(index=INDEX_NAME, keep_alive=PIT_KEEP_ALIVE))["id"]
+
+    body = search_body(query, 0 if state["after"] else state["from"], size, fields=fields)
+    if state["after"]:
+        body["search_after"] = state["after"]
+
+    start = time.perf_counter()
+    try:
+        response = await observe_es("search_after", es.search(
+            body={**body, "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}}, filter_path=SEARCH_FILTER_PATH
+        ), **query_shape(body))
+    except NotFoundError:
+        error = ErrorResponse(code="CURSOR_EXPIRED", message="The cursor has expired, restart the search from the first page.")
+        raise HTTPException(status_code=400, detail=error.model_dump()) from None
+
+    # Recorded without its point in time, likely closed by the time it is profiled: the profile runs on the live index
+    slow_query_log.record(
+        "search_after", body,
+        {"title": state["title"], "year": state["year"], "page": state["page"], "size": size, "fields": fields},
+        time.perf_counter() - start, response
+    )
+
+    pit_id = response.get("pit_id", pit_id)
+    hits = response["hits"].get("hits", [])
+
+    # An empty page (`size=0`) has no last hit to continue from
+    next_cursor = None
+    if hits and len(hits) == size:
+        next_cursor = encode_cursor({
+            "title": state["title"], "year": state["year"], "page": state["page"] + 1,
+            "from": None, "pit": pit_id, "after": hits[-1]["sort"]
+        })
+    else:
+        await es.close_point_in_time(id=pit_id)
+
+    return {
+        "movies": [hit["_source"] for hit in hits],
+        "total_results": response["hits"]["total"]["value"],
+        "total_relation": response["hits"]["total"].get("relation", "eq"),
+        "page": state["page"],
+        "size": size,
+        "next_cursor": next_cursor,
+        "aggregations": None
+    }
+
+
+async def scan_movies(title: str = None, year: int = None, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Yield every movie matching `title` and `year`, in batches of `batch_size`.
+
+    The batches are read inside a point in time, in index order (`_shard_doc`, the cheapest sort)
+    with `search_after`, so memory stays constant whatever the size of the result set and the
+    next batch is only requested once the previous one has been consumed.
+    """
+    es = get_async_es()
+    query = build_search_query(title, year)
+    pit_id = (await es.open_point_in_time(index=INDEX_NAME, keep_alive=PIT_KEEP_ALIVE))["id"]
+    sort = [{"_shard_doc": "asc"}]
+    shape = query_shape({"query": query, "sort": sort})
+    position = {}
+
+    try:
+        while True:
+            response = await observe_es("scan", es.search(
+                pit={"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                query=query,
+                size=batch_size,
+                sort=sort,
+                track_total_hits=False,
+                **position
+            ), **shape)
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+
+            if hits:
+                yield [hit["_source"] for hit in hits]
+
+            if len(hits) < batch_size:
+                break
+
+            position = {"search_after": hits[-1]["sort"]}
+    finally:
+        try:
+            await es.close_point_in_time(id=pit_id)
+        except Exception:
+            logger.warning("Could not close the point in time of an export", exc_info=True)
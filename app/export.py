@@ -0,0 +1,37 @@
+import csv
+import io
+import json
+
+EXPORT_FIELDS = ["Title", "Year", "imdbID"]
+
+
+async def ndjson_chunks(first_batch: list, batches):
+    """
+    Encode batches of movies as NDJSON, one chunk per batch.
+    """
+    if first_batch:
+        yield "".join(json.dumps(movie) + "\n" for movie in first_batch)
+
+    async for batch in batches:
+        yield "".join(json.dumps(movie) + "\n" for movie in batch)
+
+
+async def csv_chunks(first_batch: list, batches):
+    """
+    Encode batches of movies as CSV with a header row, one chunk per batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+
+    def flush(batch):
+        writer.writerows(batch)
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writeheader()
+    yield flush(first_batch)
+
+    async for batch in batches:
+        yield flush(batch)
@@ -0,0 +1,85 @@
+import hashlib
+import logging
+
+from app.database import redis_client
+from app.config import FINGERPRINT_FLUSH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Redis hash of the fingerprints of the movies of an index, keyed by imdbID
+FINGERPRINTS_KEY = "movie-fingerprints"
+
+
+def movie_fingerprint(doc: dict):
+    """
+    Compact hash of the fields of a movie document besides its id.
+    """
+    return hashlib.blake2b(f"{doc['Title']}\x1f{doc['Year']}".encode(), digest_size=8).hexdigest()
+
+
+class FingerprintStore:
+    """
+    Fingerprints of the movies written to a concrete Elasticsearch index, in a Redis hash.
+
+    `changed` filters the fetched documents down to those whose fingerprint differs from the
+    stored one (all of them unless `skip_unchanged`), and remembers their new fingerprint until
+    Elasticsearch acknowledges the write (`written`). Acknowledged fingerprints are saved in
+    batches of `FINGERPRINT_FLUSH_SIZE`, so a failed write is retried by the next crawl.
+
+    Redis errors never fail the load: unknown fingerprints only mean more documents are written.
+    A document deleted from the index behind the store's back is not written again until a reindex.
+    """
+    def __init__(self, index: str, skip_unchanged: bool = True):
+        self.index = index
+        self.key = f"{FINGERPRINTS_KEY}:{index}"
+        self.skip_unchanged = skip_unchanged
+        self.pending = {}
+        self.written_fingerprints = {}
+        self.unchanged = 0
+
+    async def changed(self, docs: list):
+        fingerprints = [movie_fingerprint(doc) for doc in docs]
+
+        stored = [None] * len(docs)
+        if self.skip_unchanged and docs:
+            try:
+                stored = await redis_client.hmget(self.key, [doc["imdbID"] for doc in docs])
+            except Exception:
+                logger.warning("Could not read the movie fingerprints, writing every document", exc_info=True)
+
+        changed = []
+        for doc, fingerprint, previous in zip(docs, fingerprints, stored):
+            if fingerprint == previous:
+                self.unchanged += 1
+                continue
+            self.pending[doc["imdbID"]] = fingerprint
+            changed.append(doc)
+
+        return changed
+
+    async def written(self, doc_id: str, ok: bool):
+        fingerprint = self.pending.pop(doc_id, None)
+        if ok and fingerprint is not None:
+            self.written_fingerprints[doc_id] = fingerprint
+            if len(self.written_fingerprints) >= FINGERPRINT_FLUSH_SIZE:
+                await self.flush()
+
+    async def flush(self):
+        if not self.written_fingerprints:
+            return
+
+        try:
+            await redis_client.hset(self.key, mapping=self.written_fingerprints)
+        except Exception:
+            logger.warning("Could not save the movie fingerprints", exc_info=True)
+        self.written_fingerprints = {}
+
+
+async def delete_fingerprints(index: str):
+    """
+    Forget the fingerprints of `index`, once it is deleted.
+    """
+    try:
+        await redis_client.delete(f"{FINGERPRINTS_KEY}:{index}")
+    except Exception:
+        logger.warning(f"Could not delete the movie fingerprints of {index}", exc_info=True)
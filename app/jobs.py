@@ -0,0 +1,258 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from app.database import redis_client
+from app.config import INDEX_JOBS_WORKERS, INDEX_JOBS_REDIS_STATE, INDEX_JOBS_TTL
+from app.elastic_utils import index_movies, reindex_movies
+from app.models import IndexJobResponse
+from app.search_cache import invalidate_searches
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two saves of a running job's progress to Redis
+PROGRESS_FLUSH_INTERVAL = 1
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class IndexJob:
+    """
+    State of a background indexing run.
+
+    `index_movies` reports its progress through `page_fetched`, `document_indexed` and `cancelled`.
+    """
+    def __init__(self, title: str, page: int, reindex: bool = False, job_id: str = None, delta: bool = False):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.title = title
+        self.page = page
+        self.reindex = reindex
+        self.delta = delta
+        self.index = None
+        self.status = QUEUED
+        self.pages_fetched = 0
+        self.total_pages = None
+        self.docs_indexed = 0
+        self.docs_failed = 0
+        self.errors = []
+        self.error = None
+        self.cancel_requested = False
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_requested
+
+    @property
+    def finished(self):
+        return self.status in (COMPLETED, FAILED, CANCELLED)
+
+    def page_fetched(self, total_pages: int):
+        if self.total_pages is None:
+            # Pages before the starting page are never fetched
+            self.total_pages = max(total_pages - self.page + 1, 1)
+        self.pages_fetched += 1
+
+    def document_indexed(self, ok: bool):
+        if ok:
+            self.docs_indexed += 1
+        else:
+            self.docs_failed += 1
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        job = cls(data["title"], data["page"], job_id=data["job_id"])
+        vars(job).update(data)
+        return job
+
+    def to_response(self):
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0
+        throughput = self.docs_indexed / elapsed if elapsed else 0.0
+
+        eta = None
+        if self.status == RUNNING and self.total_pages and self.pages_fetched:
+            remaining_pages = max(self.total_pages - self.pages_fetched, 0)
+            eta = remaining_pages * elapsed / self.pages_fetched
+
+        return IndexJobResponse(
+            job_id=self.job_id,
+            status=self.status,
+            title=self.title,
+            page=self.page,
+            reindex=self.reindex,
+            delta=self.delta,
+            index=self.index,
+            pages_fetched=self.pages_fetched,
+            total_pages=self.total_pages,
+            docs_indexed=self.docs_indexed,
+            docs_failed=self.docs_failed,
+            throughput=round(throughput, 2),
+            eta_seconds=round(eta, 2) if eta is not None else None,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            error=self.error,
+            errors=self.errors
+        )
+
+
+class IndexJobManager:
+    """
+    In-process queue of indexing jobs consumed by `INDEX_JOBS_WORKERS` asyncio workers.
+
+    When `INDEX_JOBS_REDIS_STATE` is enabled, the state of every job is also stored in Redis
+    so any worker process can report progress and request the cancellation of a job it does not run.
+    """
+    def __init__(self, workers: int = INDEX_JOBS_WORKERS, use_redis: bool = INDEX_JOBS_REDIS_STATE):
+        self.workers = workers
+        self.use_redis = use_redis
+        self.jobs = {}
+        self.queue = None
+        self.tasks = []
+        self.loop = None
+
+    def start(self):
+        """
+        Start the workers on the running event loop. Jobs still queued on a previous loop are carried over,
+        so the manager also works when the app runs without its lifespan (e.g. in tests).
+        """
+        loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+        for job in self.jobs.values():
+            if job.status == QUEUED:
+                self.queue.put_nowait(job)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.loop = None
+
+    async def enqueue(self, title: str, page: int, reindex: bool = False, delta: bool = False):
+        self.start()
+        self.prune()
+
+        job = IndexJob(title, page, reindex, delta=delta)
+        self.jobs[job.job_id] = job
+        await self.save(job)
+        self.queue.put_nowait(job)
+
+        return job
+
+    async def get(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job:
+            return job
+
+        if self.use_redis:
+            data = await redis_client.get(self.state_key(job_id))
+            if data:
+                return IndexJob.from_dict(json.loads(data))
+
+        return None
+
+    async def cancel(self, job_id: str):
+        job = await self.get(job_id)
+        if job is None or job.finished:
+            return job
+
+        job.cancel_requested = True
+
+        if job.job_id in self.jobs:
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+            await self.save(job)
+        else:
+            # The job runs in another process, which polls this flag while saving its progress
+            await redis_client.setex(self.cancel_key(job_id), INDEX_JOBS_TTL, "1")
+
+        return job
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.status == QUEUED:
+                    await self.run(job)
+            except Exception:
+                logger.exception(f"Indexing job {job.job_id} could not be completed")
+            finally:
+                self.queue.task_done()
+
+    async def run(self, job: IndexJob):
+        job.status = RUNNING
+        job.started_at = time.time()
+        await self.save(job)
+
+        flusher = asyncio.create_task(self.flush_progress(job))
+        try:
+            if job.reindex:
+                result = await reindex_movies(job.title, job.page, job)
+            else:
+                result = await index_movies(job.title, job.page, job, delta=job.delta)
+            job.errors = result["errors"]
+            job.index = result.get("index")
+            job.status = CANCELLED if job.cancel_requested else COMPLETED
+        except Exception as e:
+            logger.exception(f"Indexing job {job.job_id} failed")
+            job.status = FAILED
+            job.error = str(getattr(e, "detail", e))
+        finally:
+            flusher.cancel()
+            job.finished_at = time.time()
+
+        if job.docs_indexed:
+            await invalidate_searches()
+
+        await self.save(job)
+
+    async def flush_progress(self, job: IndexJob):
+        while True:
+            await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+            if self.use_redis and await redis_client.exists(self.cancel_key(job.job_id)):
+                job.cancel_requested = True
+            await self.save(job)
+
+    async def save(self, job: IndexJob):
+        if self.use_redis:
+            await redis_client.setex(self.state_key(job.job_id), INDEX_JOBS_TTL, json.dumps(job.to_dict()))
+
+    def prune(self):
+        """
+        Forget finished jobs older than `INDEX_JOBS_TTL`.
+        """
+        expired = time.time() - INDEX_JOBS_TTL
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and job.finished_at < expired:
+                del self.jobs[job_id]
+
+    @staticmethod
+    def state_key(job_id: str):
+        return f"index-job:{job_id}"
+
+    @staticmethod
+    def cancel_key(job_id: str):
+        return f"index-job:{job_id}:cancel"
+
+
+job_manager = IndexJobManager()
@@ -1,31 +1,83 @@
+import asyncio
+import logging
+
 from fastapi import FastAPI
 from redis import asyncio as aioredis
+from elasticsearch import ConnectionError as ElasticsearchConnectionError, ConnectionTimeout as ElasticsearchConnectionTimeout
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from contextlib import asynccontextmanager
 from app.routes.routes import router
 from app.routes.auth import router as auth_router 
+from app.routes.health import router as health_router
+from app.routes.metrics import router as metrics_router
 from app.elastic_utils import create_index
 from app.config import REDIS_URL
+from app.database import wait_for_elasticsearch, close_clients
+from app.jobs import job_manager
+from app.security import key_store
+from app.tracing import setup_tracing, shutdown_tracing
+from app.cache import TieredBackend
 from app.middleware.idempotency import IdempotencyMiddleware
-from app.middleware.error_handler import ErrorHandlerMiddleware
+from app.middleware.error_handler import ErrorHandlerMiddleware, elasticsearch_unavailable_handler
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.tracing import TracingMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+async def init_elasticsearch():
+    """
+    Wait for Elasticsearch in the background and create the index once it answers,
+    so the app starts serving (and answering health checks) immediately.
+    """
+    try:
+        if await wait_for_elasticsearch():
+            await create_index()
+            logger.info("Elasticsearch index created!")
+    except Exception:
+        logger.exception("Could not initialize the Elasticsearch index")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Initializing Elasticsearch index...")
-    create_index()
-    print("Elasticsearch index created!")
-    
+    setup_tracing()
+
+    app.state.es_init = asyncio.create_task(init_elasticsearch())
+
     redis = aioredis.from_url(REDIS_URL)
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
-    
+    FastAPICache.init(TieredBackend(RedisBackend(redis)), prefix="fastapi-cache")
+
+    job_manager.start()
+
+    # Fail at startup rather than on the first request if the JWKS file is unreadable
+    if key_store.path:
+        key_store.load(force=True)
+
     yield
 
+    app.state.es_init.cancel()
+    await job_manager.stop()
+    await close_clients()
+    shutdown_tracing()
+
 app = FastAPI(title="FastAPI + Elasticsearch", version="1.0.0", lifespan=lifespan)
 
 # Add middlewares globally
 app.add_middleware(IdempotencyMiddleware)
 app.add_middleware(ErrorHandlerMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+# Serve stale results (or 503) while Elasticsearch is unreachable
+app.add_exception_handler(ElasticsearchConnectionError, elasticsearch_unavailable_handler)
+app.add_exception_handler(ElasticsearchConnectionTimeout, elasticsearch_unavailable_handler)
+
+# Include health checks (liveness and readiness probes)
+app.include_router(health_router)
+
+# Include Prometheus metrics
+app.include_router(metrics_router)
 
 # Include authentication routes for OAuth2
 app.include_router(auth_router)
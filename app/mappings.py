@@ -0,0 +1,48 @@
+from app.config import ES_NUMBER_OF_SHARDS, ES_NUMBER_OF_REPLICAS, ES_REFRESH_INTERVAL
+
+# Bump when INDEX_SETTINGS or INDEX_MAPPINGS change, existing indices keep the version they were created with
+MAPPING_VERSION = 1
+
+# Length of the grams indexed in `Title.ngram`, shorter titles cannot be matched through it
+NGRAM_SIZE = 3
+
+INDEX_SETTINGS = {
+    "number_of_shards": ES_NUMBER_OF_SHARDS,
+    "number_of_replicas": ES_NUMBER_OF_REPLICAS,
+    "refresh_interval": ES_REFRESH_INTERVAL,
+    "analysis": {
+        "tokenizer": {
+            # Every window of NGRAM_SIZE characters, spaces and punctuation included,
+            # so any substring of the title can be matched as a phrase of grams
+            "title_ngram_tokenizer": {
+                "type": "ngram",
+                "min_gram": NGRAM_SIZE,
+                "max_gram": NGRAM_SIZE,
+                "token_chars": []
+            }
+        },
+        "analyzer": {
+            "title_ngram": {
+                "type": "custom",
+                "tokenizer": "title_ngram_tokenizer",
+                "filter": ["lowercase"]
+            }
+        }
+    }
+}
+
+INDEX_MAPPINGS = {
+    "_meta": {"version": MAPPING_VERSION},
+    "dynamic": False,
+    "properties": {
+        "Title": {
+            "type": "text",
+            "fields": {
+                "keyword": {"type": "keyword", "ignore_above": 256},
+                "ngram": {"type": "text", "analyzer": "title_ngram"}
+            }
+        },
+        "Year": {"type": "integer", "doc_values": True},
+        "imdbID": {"type": "keyword"}
+    }
+}
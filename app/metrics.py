@@ -0,0 +1,109 @@
+import time
+
+from anyio import to_thread
+from prometheus_client import Counter, Gauge, Histogram
+from app.tracing import span
+
+# Latency buckets (seconds) from cache hits to slow Elasticsearch queries
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Duration of HTTP requests", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served")
+
+ES_REQUEST_SECONDS = Histogram(
+    "elasticsearch_request_duration_seconds", "Duration of Elasticsearch queries seen by the app", ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+ES_TOOK_SECONDS = Histogram(
+    "elasticsearch_took_seconds", "Time Elasticsearch reports spending on queries (`took`)", ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+
+CACHE_LOOKUPS = Counter("search_cache_lookups_total", "Search cache lookups per tier", ["tier", "result"])
+LOCAL_CACHE_EVICTIONS = Counter("search_cache_local_evictions_total", "Entries evicted from the local cache tier")
+
+IDEMPOTENCY_REDIS_SECONDS = Histogram(
+    "idempotency_redis_duration_seconds", "Duration of the Redis commands of the idempotency middleware", ["command"],
+    buckets=LATENCY_BUCKETS
+)
+
+MOVIES_API_REQUEST_SECONDS = Histogram(
+    "movies_api_request_duration_seconds", "Duration of the external movies API requests (every attempt)",
+    buckets=LATENCY_BUCKETS
+)
+MOVIES_API_PAGES = Counter("movies_api_pages_total", "Pages fetched from the external movies API")
+
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests rejected by admission control", ["budget", "reason"]
+)
+ADMISSION_IN_PROGRESS = Gauge("admission_in_progress", "Elasticsearch calls holding a slot", ["budget"])
+ADMISSION_QUEUED = Gauge("admission_queued", "Elasticsearch calls waiting for a slot", ["budget"])
+
+THREADPOOL_BUSY = Gauge("threadpool_busy_threads", "Threads of the default threadpool in use")
+THREADPOOL_SIZE = Gauge("threadpool_size", "Threads of the default threadpool")
+
+
+async def observe_es(operation: str, call, **attributes):
+    """
+    Await an Elasticsearch query, recording its duration and the `took` of its response.
+
+    The query is traced as an `elasticsearch.<operation>` span with `attributes` (e.g. its
+    `query_shape`), and the `took` of the response once it arrives.
+    """
+    start = time.perf_counter()
+    try:
+        with span(f"elasticsearch.{operation}", **attributes) as current:
+            response = await call
+            if current is not None and "took" in response:
+                current.set_attribute("took", response["took"])
+    finally:
+        ES_REQUEST_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
+    if "took" in response:
+        ES_TOOK_SECONDS.labels(operation).observe(response["took"] / 1000)
+
+    return response
+
+
+def clause_shape(clause: dict):
+    """
+    Types and fields of a query clause without its values, e.g. `bool(must=[match_phrase(Title.ngram)], filter=[term(Year)])`.
+    """
+    shapes = []
+    for kind, spec in clause.items():
+        if kind == "bool":
+            occurrences = []
+            for occurrence, clauses in spec.items():
+                clauses = [clauses] if isinstance(clauses, dict) else clauses
+                if isinstance(clauses, list) and clauses:
+                    occurrences.append(f"{occurrence}=[{', '.join(clause_shape(inner) for inner in clauses)}]")
+            shapes.append(f"bool({', '.join(occurrences)})")
+        else:
+            shapes.append(f"{kind}({', '.join(spec) if isinstance(spec, dict) else ''})")
+    return ", ".join(shapes)
+
+
+def query_shape(*bodies: dict):
+    """
+    Span attributes describing search bodies (one per search of an `_msearch`) without the values
+    searched for, so they can be grouped: the shape of their queries, their sort fields and the
+    names of their aggregations.
+    """
+    sort = [entry if isinstance(entry, str) else next(iter(entry)) for body in bodies for entry in body.get("sort", [])]
+    return {
+        "query": [clause_shape(body.get("query", {})) for body in bodies],
+        "sort": list(dict.fromkeys(sort)),
+        "aggs": list(dict.fromkeys(name for body in bodies for name in body.get("aggs", {})))
+    }
+
+
+def update_threadpool_gauges():
+    """
+    Sample the usage of the threadpool running sync endpoints and `run_in_threadpool` calls.
+    Must be called from the event loop.
+    """
+    limiter = to_thread.current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
@@ -1,22 +1,65 @@
 import logging
 
 from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.models import ErrorResponse
+from app.search_cache import get_stale_result
+from app.tracing import span
 
 logger = logging.getLogger(__name__)
 
-class ErrorHandlerMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+class ErrorHandlerMiddleware:
+    """
+    Convert the exceptions escaping the app (and the inner middlewares) to JSON error responses.
+
+    Plain ASGI middleware: responses, including streamed ones, pass through untouched.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            response = await call_next(request)
-            return response
+            with span("middleware.error_handler"):
+                await self.app(scope, receive, send_wrapper)
         except HTTPException as e:
+            if response_started:
+                raise
             error = ErrorResponse(code=str(e.status_code), message=e.detail)
             logger.error(f"Error {e.status_code}: {e.detail}")
-            return JSONResponse(status_code=e.status_code, content=error.model_dump())
-        except Exception as e:
+            response = JSONResponse(status_code=e.status_code, content=error.model_dump())
+            await response(scope, receive, send)
+        except Exception:
+            if response_started:
+                raise
             error = ErrorResponse(code="SERVER_ERROR", message="An unexpected error occurred.")
             logger.exception("Unexpected server error")
-            return JSONResponse(status_code=500, content=error.model_dump())
+            response = JSONResponse(status_code=500, content=error.model_dump())
+            await response(scope, receive, send)
+
+
+async def elasticsearch_unavailable_handler(request: Request, exc: Exception):
+    """
+    Degraded mode: while Elasticsearch is unreachable, serve the last known result of the
+    request if there is one (flagged with the `X-Degraded` header), otherwise answer 503.
+    """
+    stale = await get_stale_result(request) if request.method == "GET" else None
+    if stale is not None:
+        logger.warning(f"Elasticsearch unreachable, serving stale result for {request.url.path}")
+        return JSONResponse(content=stale, headers={"X-Degraded": "stale"})
+
+    error = ErrorResponse(code="ELASTICSEARCH_UNAVAILABLE", message="The search service is temporarily unavailable.")
+    logger.error(f"Elasticsearch unreachable: {exc}")
+    return JSONResponse(status_code=503, content={"detail": error.model_dump()}, headers={"Retry-After": "5"})
@@ -1,31 +1,159 @@
+import asyncio
+import base64
+import json
 import logging
 import hashlib
+import time
+import zlib
 
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import IDEMPOTENCY_KEY_TTL, IDEMPOTENCY_LOCK_TTL, IDEMPOTENCY_MAX_RESPONSE_BYTES, IDEMPOTENCY_WAIT_TIMEOUT
 from app.database import redis_client
+from app.metrics import IDEMPOTENCY_REDIS_SECONDS
+from app.tracing import span
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-class IdempotencyMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        idempotency_key = request.headers.get("Idempotency-Key")
+# Only requests changing state can be repeated by mistake
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
 
+# Values of a key before (or instead of) the stored response
+IN_FLIGHT = "in-flight"
+NOT_STORED = "processed"  # The response was too large to be stored
+
+# Seconds between two checks of a key still in flight
+POLL_INTERVAL = 0.1
+
+
+def encode_response(status: int, headers: list, body: bytes):
+    record = {
+        "status": status,
+        "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers],
+        "body": body.decode("latin-1")
+    }
+    return base64.b64encode(zlib.compress(json.dumps(record).encode())).decode()
+
+
+def decode_response(value: str):
+    record = json.loads(zlib.decompress(base64.b64decode(value)))
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+    return record["status"], headers, record["body"].encode("latin-1")
+
+
+class IdempotencyMiddleware:
+    """
+    Run a mutating request carrying an `Idempotency-Key` at most once per key and path.
+
+    The first request claims the key with an atomic `SET NX`, and its response (status, headers and body,
+    compressed, up to `IDEMPOTENCY_MAX_RESPONSE_BYTES`) is stored for `IDEMPOTENCY_KEY_TTL` seconds.
+    Only successful (2xx) responses are stored: after an error (401, 429, 503...) the claim is
+    released, so the client can retry with the same key.
+    Repeated requests get that response replayed verbatim, with the `Idempotent-Replayed` header.
+    A repeat arriving while the first request still runs waits for its response (up to
+    `IDEMPOTENCY_WAIT_TIMEOUT` seconds). Responses too large to be stored answer repeats with 409.
+
+    Plain ASGI middleware: other requests go straight to the app, without touching Redis.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        idempotency_key = Headers(scope=scope).get("Idempotency-Key")
         if not idempotency_key:
-            logger.info(f"Request to {request.url.path} WITHOUT Idempotency-Key")
-            return await call_next(request)  # If there is no key, continue as normal
+            await self.app(scope, receive, send)  # If there is no key, continue as normal
+            return
+
+        with span("middleware.idempotency"):
+            await self.handle(idempotency_key, scope, receive, send)
 
+    async def handle(self, idempotency_key: str, scope: Scope, receive: Receive, send: Send):
         # Generate a hash of the key + endpoint URL
-        cache_key = f"idempotency:{hashlib.sha256((idempotency_key + request.url.path).encode()).hexdigest()}"
+        cache_key = f"idempotency:{hashlib.sha256((idempotency_key + scope['path']).encode()).hexdigest()}"
+
+        # Claim the key in a single atomic command: only the first request gets it
+        with IDEMPOTENCY_REDIS_SECONDS.labels("claim").time():
+            claimed = await redis_client.set(cache_key, IN_FLIGHT, nx=True, ex=IDEMPOTENCY_LOCK_TTL)
 
-        # Check if the key already exists in Redis
-        if await redis_client.exists(cache_key):
-            logger.warning(f"Duplicate request detected for {request.url.path} with key {idempotency_key}")
+        if claimed:
+            await self.run_and_store(cache_key, scope, receive, send)
+            return
+
+        stored = await self.wait_for_response(cache_key)
+
+        if stored == IN_FLIGHT:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+        if stored is None or stored == NOT_STORED:
+            logger.warning(f"Duplicate request detected for {scope['path']} with key {idempotency_key}")
             raise HTTPException(status_code=409, detail="Duplicate request detected")
 
-        # Store the key in Redis for 10 minutes
-        await redis_client.setex(cache_key, 600, "processed")
-        logger.info(f"Request to {request.url.path} stored with Idempotency-Key: {idempotency_key}")
+        status, headers, body = decode_response(stored)
+        await send({"type": "http.response.start", "status": status, "headers": headers + [(b"idempotent-replayed", b"true")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def run_and_store(self, cache_key: str, scope: Scope, receive: Receive, send: Send):
+        """
+        Run the request, passing its response through while keeping a copy of it.
+        """
+        response = {"status": None, "headers": [], "body": bytearray(), "complete": False}
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body" and response["body"] is not None:
+                response["body"] += message.get("body", b"")
+                if len(response["body"]) > IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                    response["body"] = None  # Stop copying, the response will not be stored
+                response["complete"] = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            # Nothing was stored, let the client retry with the same key
+            await redis_client.delete(cache_key)
+            raise
+
+        # The request did not take effect (or may succeed later): let the client retry with the same key
+        if response["status"] is None or not 200 <= response["status"] < 300:
+            try:
+                await redis_client.delete(cache_key)
+            except Exception:
+                logger.warning(f"Could not release the Idempotency-Key claim of {scope['path']}", exc_info=True)
+            return
+
+        if response["body"] is not None and response["complete"]:
+            value = encode_response(response["status"], response["headers"], bytes(response["body"]))
+        else:
+            value = NOT_STORED
+
+        try:
+            with IDEMPOTENCY_REDIS_SECONDS.labels("store").time():
+                await redis_client.set(cache_key, value, ex=IDEMPOTENCY_KEY_TTL)
+        except Exception:
+            # The response was already sent, repeats get 409 until the claim expires
+            logger.warning(f"Could not store the response of {scope['path']} for replay", exc_info=True)
+
+    async def wait_for_response(self, cache_key: str):
+        """
+        Get the value of a claimed key, waiting while the request that claimed it is in flight.
+        """
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+
+        with IDEMPOTENCY_REDIS_SECONDS.labels("get").time():
+            stored = await redis_client.get(cache_key)
+
+        while stored == IN_FLIGHT and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            with IDEMPOTENCY_REDIS_SECONDS.labels("get").time():
+                stored = await redis_client.get(cache_key)
 
-        return await call_next(request)
+        return stored
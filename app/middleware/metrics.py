@@ -0,0 +1,56 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_PROGRESS
+from app.tracing import span
+
+
+def route_template(scope: Scope):
+    """
+    Path template of the route that served the request (`/api/v1/movies/index/jobs/{job_id}`, not every
+    job id), so the label set stays bounded. Routes of included routers may only know their path
+    without the router prefix, which is then taken from the request path.
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return "unmatched"
+
+    try:
+        suffix = path_format.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return path_format
+
+    path = scope["path"]
+    prefix = path[:-len(suffix)] if suffix and path.endswith(suffix) else ""
+    return prefix + path_format
+
+
+class MetricsMiddleware:
+    """
+    Record the duration of every HTTP request, labelled by method, route template and status.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            with span("middleware.metrics"):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route_template(scope), str(status)).observe(time.perf_counter() - start)
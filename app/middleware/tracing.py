@@ -0,0 +1,30 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app import tracing
+from app.middleware.metrics import route_template
+
+
+class TracingMiddleware:
+    """
+    Open the root span of every HTTP request, named after its route template once it is known.
+    Requests go straight to the app while tracing is disabled.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or tracing.tracer is None:
+            await self.app(scope, receive, send)
+            return
+
+        with tracing.server_span(scope) as span:
+            async def send_wrapper(message: Message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = route_template(scope)
+                span.set_attribute("http.route", route)
+                span.update_name(f"{scope['method']} {route}")
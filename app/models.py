@@ -1,22 +1,107 @@
 import uuid
 
-from pydantic import BaseModel
-from typing import List
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional, Union
+
+SearchAggregation = Literal["years", "decades", "year_range"]
+MovieField = Literal["Title", "Year", "imdbID"]
 
 class Movie(BaseModel):
     Title: str
     Year: int
     imdbID: str
 
+class ProjectedMovie(BaseModel):  # Only the `fields` requested from a search, the others are left out
+    Title: Optional[str] = None
+    Year: Optional[int] = None
+    imdbID: Optional[str] = None
+
+class Bucket(BaseModel):
+    key: int
+    count: int
+
+class MovieAggregations(BaseModel):
+    years: Optional[List[Bucket]] = None  # Movies per year
+    decades: Optional[List[Bucket]] = None  # Movies per decade, keyed by its first year
+    min_year: Optional[int] = None
+    max_year: Optional[int] = None
+
 class MovieSearchResponse(BaseModel):
-    movies: List[Movie]
+    movies: List[Union[Movie, ProjectedMovie]]  # `ProjectedMovie` when `fields` are requested
     total_results: int
+    total_relation: Literal["eq", "gte"] = "eq"  # `gte` when `total_results` is a lower bound
     page: int
     size: int
+    next_cursor: Optional[str] = None  # Pass as `cursor` to get the next page, `None` on the last page
+    aggregations: Optional[MovieAggregations] = None  # Requested with `aggs`
+
+class MovieSearchSpec(BaseModel):
+    title: str
+    year: Optional[int] = None
+    page: int = Field(1, ge=1)
+    size: int = Field(10, ge=0, le=100)
+    aggs: Optional[List[SearchAggregation]] = None
+    fields: Optional[List[MovieField]] = None
     
+class ProfiledQuery(BaseModel):
+    type: str
+    description: str
+    time_ms: float
+
+class ShardProfile(BaseModel):
+    id: str
+    query_ms: float
+    collector_ms: float
+    aggregations_ms: float
+    queries: List[ProfiledQuery]  # Top-level query clauses
+
+class SlowQuery(BaseModel):
+    id: str
+    timestamp: datetime
+    operation: str
+    params: dict  # Search parameters of the request
+    body: dict  # Request body sent to Elasticsearch
+    elapsed_ms: float  # Duration seen by the app
+    took_ms: Optional[int] = None  # Duration reported by Elasticsearch
+    shards: Optional[dict] = None  # `_shards` of the response
+    profile: Optional[List[ShardProfile]] = None  # Set once a sampled search has been profiled
+    profile_error: Optional[str] = None
+
+class BulkItemError(BaseModel):
+    imdbID: str
+    status: int
+    error: str
+
 class IndexMovieResponse(BaseModel):
     status: str
     total_indexed: int
+    total_failed: int = 0
+    created: int = 0  # Movies new to the index
+    updated: int = 0  # Movies written over an existing document
+    unchanged: int = 0  # Movies skipped by a delta load
+    errors: List[BulkItemError] = []
+    index: Optional[str] = None  # Index built by a reindex
+
+class IndexJobResponse(BaseModel):
+    job_id: str
+    status: str
+    title: str
+    page: int
+    reindex: bool = False
+    delta: bool = False
+    index: Optional[str] = None  # Index built by a reindex
+    pages_fetched: int
+    total_pages: Optional[int] = None
+    docs_indexed: int
+    docs_failed: int
+    throughput: float  # Documents indexed per second
+    eta_seconds: Optional[float] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    errors: List[BulkItemError] = []
 
 class ErrorResponse(BaseModel):
     id: str
@@ -27,4 +112,13 @@ class ErrorResponse(BaseModel):
         super().__init__(id=str(uuid.uuid4()), code=code, message=message)
 
 class ErrorResponseDetail(BaseModel):
-    detail: ErrorResponse
\ No newline at end of file
+    detail: ErrorResponse
+
+class HealthResponse(BaseModel):
+    status: str
+
+class ReadinessResponse(BaseModel):
+    status: str
+    elasticsearch: str
+    redis: str
+    index: str  # "pending" until the index exists with the current mappings (created or migrated)
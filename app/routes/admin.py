@@ -0,0 +1,31 @@
+from typing import List
+from fastapi import APIRouter, Depends, Response
+from app.security import validate_jwt_token
+from app.slow_queries import slow_query_log
+from app.models import ErrorResponseDetail, SlowQuery
+
+router = APIRouter()
+
+
+@router.get("/slow-queries", dependencies=[Depends(validate_jwt_token)], response_model=List[SlowQuery], responses={
+                401: {"model": ErrorResponseDetail, "description": "Unauthorized. Invalid or missing token."},
+            })
+async def list_slow_queries():
+    """
+    Searches slower than `SLOW_QUERY_THRESHOLD_MS` recorded by this worker, slowest first.
+
+    Only the latest `SLOW_QUERY_LOG_SIZE` slow searches are kept. The `profile` of a sampled search
+    (`SLOW_QUERY_PROFILE_RATIO`) is filled in once Elasticsearch has run it again with `profile: true`.
+    """
+    return slow_query_log.slowest()
+
+
+@router.delete("/slow-queries", dependencies=[Depends(validate_jwt_token)], status_code=204, responses={
+                   401: {"model": ErrorResponseDetail, "description": "Unauthorized. Invalid or missing token."},
+               })
+async def clear_slow_queries():
+    """
+    Forget the slow searches recorded by this worker.
+    """
+    slow_query_log.clear()
+    return Response(status_code=204)
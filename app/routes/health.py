@@ -0,0 +1,45 @@
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app import elastic_utils
+from app.database import get_async_es, redis_client
+from app.models import HealthResponse, ReadinessResponse
+
+router = APIRouter(tags=["Health"])
+
+# Seconds each dependency has to answer the readiness probe
+PROBE_TIMEOUT = 2
+
+
+async def probe(ping):
+    try:
+        return "up" if await asyncio.wait_for(ping(), timeout=PROBE_TIMEOUT) else "down"
+    except Exception:
+        return "down"
+
+
+@router.get("/healthz", response_model=HealthResponse, summary="Liveness probe")
+async def healthz():
+    """
+    Liveness probe: answers as soon as the process serves requests, without touching any dependency.
+    """
+    return HealthResponse(status="ok")
+
+
+@router.get("/readyz", summary="Readiness probe", responses={
+                200: {"model": ReadinessResponse, "description": "Elasticsearch and Redis are reachable, the index is ready."},
+                503: {"model": ReadinessResponse, "description": "A dependency is unreachable, or the index is not ready."}})
+async def readyz():
+    """
+    Readiness probe: checks that Elasticsearch and Redis are reachable, and that the index exists
+    with the current mappings (searches fail on an index still being migrated, see `create_index`).
+    """
+    elasticsearch, redis = await asyncio.gather(probe(get_async_es().ping), probe(redis_client.ping))
+    index = "up" if elastic_utils.index_ready else "pending"
+    ready = elasticsearch == "up" and redis == "up" and index == "up"
+
+    readiness = ReadinessResponse(
+        status="ready" if ready else "unavailable", elasticsearch=elasticsearch, redis=redis, index=index
+    )
+    return JSONResponse(status_code=200 if ready else 503, content=readiness.model_dump())
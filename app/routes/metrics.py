@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.metrics import update_threadpool_gauges
+
+router = APIRouter(tags=["Health"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics of this worker process.
+    """
+    update_threadpool_gauges()
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
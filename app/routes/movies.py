@@ -1,47 +1,147 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+import orjson
+
+from typing import List
+from fastapi import APIRouter, Body, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from app.security import validate_jwt_token 
-from fastapi_cache.decorator import cache
-from fastapi_cache import FastAPICache
-from app.elastic_utils import search_movies as search_movies_util, index_movies as index_movies_util
-from app.models import ErrorResponseDetail, IndexMovieResponse, MovieSearchResponse
+from app.admission import export_limiter, index_budget, search_budget
+from app.elastic_utils import (
+    search_movies as search_movies_util, index_movies as index_movies_util, reindex_movies as reindex_movies_util,
+    scan_movies as scan_movies_util, msearch_movies as msearch_movies_util
+)
+from app.export import csv_chunks, ndjson_chunks
+from app.jobs import job_manager
+from app.config import SEARCH_BATCH_MAX_SIZE
+from app.search_cache import (
+    save_stale_result, cached_search_response, invalidate_searches, get_cached_searches, cache_search
+)
+from app.cache import SingleFlight
+from app.models import (
+    ErrorResponse, ErrorResponseDetail, IndexJobResponse, IndexMovieResponse, MovieField, MovieSearchResponse,
+    MovieSearchSpec, SearchAggregation
+)
 
 router = APIRouter()
 
-@router.post("/index", dependencies=[Depends(validate_jwt_token)], responses={
-                 200: {"model": IndexMovieResponse, "description": "Successful response."},
+# Seconds a search result stays cached
+SEARCH_CACHE_EXPIRE = 300
+
+# Concurrent identical searches missing the cache share one Elasticsearch query
+search_flight = SingleFlight()
+
+@router.post("/index", dependencies=[Depends(validate_jwt_token), Depends(index_budget.limit_rate)], status_code=202, responses={
+                 200: {"model": IndexMovieResponse, "description": "Movies indexed (`wait=true`)."},
+                 202: {"model": IndexJobResponse, "description": "Indexing job enqueued."},
                  400: {"model": ErrorResponseDetail, "description": "Invalid request parameters."},
                  401: {"model": ErrorResponseDetail, "description": "Unauthorized. Invalid or missing token."},
+                 429: {"model": ErrorResponseDetail, "description": "Rate limit exceeded, retry after `Retry-After` seconds."},
                  502: {"model": ErrorResponseDetail, "description": "External API error while fetching movies."},
+                 503: {"model": ErrorResponseDetail, "description": "Too many loads in progress (`wait=true`)."},
                  504: {"model": ErrorResponseDetail, "description": "External API timeout."},
              })
-def index_movies_endpoint(title: str = Query("", description="Optional title substring"),
-                          page: int = Query(1, description="Optional starting page")):
+async def index_movies_endpoint(response: Response,
+                                title: str = Query("", description="Optional title substring"),
+                                page: int = Query(1, description="Optional starting page"),
+                                wait: bool = Query(False, description="Index inline and return the final result"),
+                                reindex: bool = Query(False, description="Rebuild the catalog in a new index and swap it in"),
+                                delta: bool = Query(False, description="Only write the movies that changed since the last load")):
     """
     Endpoint to index movies in Elasticsearch.
 
     - `title` (optional): Substring to filter movies by title. If empty, it fetches all available movies.
     - `page` (optional, default `1`): The starting page to fetch movies from the external API.
-    - If the client sends the `Idempotency-Key` header, duplicate requests within 10 minutes will be rejected
+    - `wait` (optional, default `false`): Run the indexing inside the request instead of in a background job.
+    - `reindex` (optional, default `false`): Build a new versioned index with the fetched movies and atomically
+    swap the search alias to it once loaded, instead of writing into the live index.
+    - `delta` (optional, default `false`): Skip the movies unchanged since they were last written to the live
+    index (compared by a fingerprint of their `Title` and `Year`). Ignored with `reindex`.
+    - If the client sends the `Idempotency-Key` header, repeats of a successful request within
+    `IDEMPOTENCY_KEY_TTL` seconds get its response replayed instead of running again. Failed requests
+    (e.g. 401, 429 or 503) can be retried with the same key.
+    - Documents rejected by Elasticsearch do not abort the load, they are reported in `errors`.
+    - Requests are limited to `INDEX_RATE_LIMIT` per second per user (429), and loads run inline to
+    `INDEX_MAX_CONCURRENCY` at once per worker (503), both with a `Retry-After` header.
 
     This endpoint retrieves movies from an external API and stores them in Elasticsearch.
     If a title is provided, only movies containing that substring will be indexed.
     If no title is given, all movies will be indexed.
+
+    By default the indexing runs in a background job: the response is returned immediately with
+    the job id, and the progress can be followed with `GET /index/jobs/{job_id}`.
     """
-    result = index_movies_util(title, page)
-    
-    FastAPICache.clear()
-    
+    if not wait:
+        job = await job_manager.enqueue(title, page, reindex, delta)
+        return job.to_response()
+
+    async with index_budget.slot():
+        if reindex:
+            result = await reindex_movies_util(title, page)
+        else:
+            result = await index_movies_util(title, page, delta=delta)
+
+    if result["total_indexed"]:
+        await invalidate_searches()
+
+    response.status_code = 200
     return IndexMovieResponse(**result)
 
 
-@router.get("/search", dependencies=[Depends(validate_jwt_token)], responses={
+@router.get("/index/jobs/{job_id}", dependencies=[Depends(validate_jwt_token)], responses={
+                 200: {"model": IndexJobResponse, "description": "Successful response."},
+                 401: {"model": ErrorResponseDetail, "description": "Unauthorized. Invalid or missing token."},
+                 404: {"model": ErrorResponseDetail, "description": "Indexing job not found."}})
+async def get_index_job_endpoint(job_id: str):
+    """
+    Endpoint to follow the progress of a background indexing job.
+
+    Returns the pages fetched, documents indexed and failed, the throughput (documents per second)
+    and, while the job is running, the estimated time to completion (`eta_seconds`).
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise_job_not_found(job_id)
+
+    return job.to_response()
+
+
+@router.delete("/index/jobs/{job_id}", dependencies=[Depends(validate_jwt_token)], responses={
+                 200: {"model": IndexJobResponse, "description": "Cancellation requested."},
+                 401: {"model": ErrorResponseDetail, "description": "Unauthorized. Invalid or missing token."},
+                 404: {"model": ErrorResponseDetail, "description": "Indexing job not found."}})
+async def cancel_index_job_endpoint(job_id: str):
+    """
+    Endpoint to cancel a background indexing job.
+
+    A queued job is cancelled immediately. A running job stops fetching new pages and finishes
+    with the `cancelled` status once the documents already fetched are indexed.
+    """
+    job = await job_manager.cancel(job_id)
+    if job is None:
+        raise_job_not_found(job_id)
+
+    return job.to_response()
+
+
+def raise_job_not_found(job_id: str):
+    error = ErrorResponse(code="JOB_NOT_FOUND", message=f"Indexing job {job_id} not found.")
+    raise HTTPException(status_code=404, detail=error.model_dump())
+
+
+@router.get("/search", responses={
                  200: {"model": MovieSearchResponse, "description": "Successful response."},
-                 401: {"model": ErrorResponseDetail, "description": "Unauthorized. Invalid or missing token."}})
-@cache(expire=300)
-def search_movies_endpoint(title: str = Query(..., description="Substring to search in movie titles"),
-                           year: int = Query(None, description="Exact year of the movie"),
-                           page: int = Query(1, ge=1, description="Page number (default: 1)"),
-                           size: int = Query(10, ge=1, le=100, description="Number of results per page (default: 10, max: 100)")):
+                 400: {"model": ErrorResponseDetail, "description": "Page too deep, or invalid or expired cursor."},
+                 401: {"model": ErrorResponseDetail, "description": "Unauthorized. Invalid or missing token."},
+                 429: {"model": ErrorResponseDetail, "description": "Rate limit exceeded, retry after `Retry-After` seconds."},
+                 503: {"model": ErrorResponseDetail, "description": "Elasticsearch unavailable and no previous result, or overloaded."}})
+async def search_movies_endpoint(request: Request,
+                                 title: str = Query(..., description="Substring to search in movie titles"),
+                                 year: int = Query(None, description="Exact year of the movie"),
+                                 page: int = Query(1, ge=1, description="Page number (default: 1)"),
+                                 size: int = Query(10, ge=0, le=100, description="Number of results per page (default: 10, max: 100)"),
+                                 cursor: str = Query(None, description="`next_cursor` of the previous page, for deep pagination"),
+                                 aggs: List[SearchAggregation] = Query(None, description="Aggregations to compute over every match"),
+                                 fields: List[MovieField] = Query(None, description="Fields of the movies to return"),
+                                 payload: dict = Depends(validate_jwt_token)):
     """
     Endpoint to search for movies in Elasticsearch with pagination.
 
@@ -49,11 +149,115 @@ def search_movies_endpoint(title: str = Query(..., description="Substring to sea
     - `year` (optional): Filter by exact release year.
     - `page` (optional, default `1`): The page number to retrieve.
     - `size` (optional, default `10`, max `100`): The number of results per page.
+    - `cursor` (optional): The `next_cursor` of the previous response. Pages past 10,000 results can only
+    be reached this way, and their latency does not grow with the page number. `page` is ignored.
+    Cursor pages are never cached.
+    - `aggs` (optional, repeatable): `years` (movies per year), `decades` (movies per decade) and/or
+    `year_range` (oldest and newest year), computed by Elasticsearch in the same request and cached
+    with the hits. Use `size=0` to only get the aggregations. Ignored with `cursor`.
+    - `fields` (optional, repeatable): `Title`, `Year` and/or `imdbID`, the only fields of the movies
+    read from Elasticsearch and returned. All of them by default.
+
+    Matches are counted exactly up to `SEARCH_TRACK_TOTAL_HITS`: past it, `total_results` is a lower
+    bound and `total_relation` is `gte` instead of `eq`.
     
     This endpoint queries Elasticsearch for movies matching the given criteria.
     It supports pagination and returns a paginated list of movies that match the search conditions.
+    While Elasticsearch is unreachable, the last known result of the same search is returned
+    with the `X-Degraded: stale` header.
+
+    Searches missing the cache are limited to `SEARCH_RATE_LIMIT` per second per user (429), and run
+    against Elasticsearch up to `SEARCH_MAX_CONCURRENCY` at once per worker, the others wait in a
+    bounded queue and are shed with 503. Both rejections carry a `Retry-After` header.
     """
-    
-    movies_data = search_movies_util(title=title, year=year, page=page, size=size)
-    
-    return MovieSearchResponse(**movies_data)
\ No newline at end of file
+    # Results are built from the documents written by `build_movie_doc`, in the shape of `MovieSearchResponse`:
+    # they are encoded once with orjson, without validation, and cached encoded
+    async def run_search():
+        async with search_budget.slot():
+            movies_data = await search_movies_util(title=title, year=year, page=page, size=size, cursor=cursor,
+                                                   aggs=aggs, fields=fields)
+        body = orjson.dumps(movies_data)
+        # A cursor is unique to its walk, and its point in time will be gone by the time a stale copy is needed
+        if not cursor:
+            await save_stale_result(request, body)
+        return body
+
+    # Only misses pay the rate limit, and each caller pays for itself before joining an identical search in flight
+    async def search():
+        await search_budget.charge(payload)
+        return await search_flight.run((title, year, page, size, cursor, tuple(aggs or ()), tuple(fields or ())), run_search)
+
+    # A cursor page points into a point in time kept open for `PIT_KEEP_ALIVE` only, shorter than the cache
+    if cursor:
+        return Response(await search(), media_type="application/json")
+
+    params = {"title": title, "year": year, "page": page, "size": size, "cursor": cursor, "aggs": aggs, "fields": fields}
+    return await cached_search_response(request, params, search, SEARCH_CACHE_EXPIRE)
+
+
+@router.post("/search/batch", response_model=List[MovieSearchResponse], responses={
+                 200: {"model": List[MovieSearchResponse], "description": "One result per search, in order."},
+                 400: {"model": ErrorResponseDetail, "description": "Page too deep."},
+                 401: {"model": ErrorResponseDetail, "description": "Unauthorized. Invalid or missing token."},
+                 429: {"model": ErrorResponseDetail, "description": "Rate limit exceeded, retry after `Retry-After` seconds."},
+                 503: {"model": ErrorResponseDetail, "description": "Too many searches in progress."}})
+async def search_movies_batch_endpoint(searches: List[MovieSearchSpec] = Body(..., min_length=1, max_length=SEARCH_BATCH_MAX_SIZE),
+                                       payload: dict = Depends(validate_jwt_token)):
+    """
+    Endpoint to run several searches in one request.
+
+    - Body: a list of up to `SEARCH_BATCH_MAX_SIZE` searches, each with the `title`, `year`, `page`,
+    `size`, `aggs` and `fields` parameters of `/search`.
+
+    Searches are resolved from the same cache as `/search`. Only the ones missing from it are sent
+    to Elasticsearch, together in a single `_msearch` request. Results are returned in the order of the searches.
+    Requests share the rate limit and concurrency limit of `/search`: each search missing the cache
+    counts as one request against the rate limit.
+    """
+    params = [{**search.model_dump(), "cursor": None} for search in searches]
+    keys, results = await get_cached_searches(params)
+
+    misses = [i for i, result in enumerate(results) if result is None]
+    if misses:
+        await search_budget.charge(payload, len(misses))
+        async with search_budget.slot():
+            found = await msearch_movies_util([params[i] for i in misses])
+        for i, result in zip(misses, found):
+            results[i] = orjson.dumps(result)
+            await cache_search(keys[i], results[i], SEARCH_CACHE_EXPIRE)
+
+    # The cached results are already encoded: the response is assembled without decoding them
+    return Response(b"[" + b",".join(results) + b"]", media_type="application/json")
+
+
+@router.get("/export", dependencies=[Depends(validate_jwt_token), Depends(search_budget.limit_rate)], responses={
+                 200: {"content": {"application/x-ndjson": {}, "text/csv": {}}, "description": "Matching movies, streamed."},
+                 401: {"model": ErrorResponseDetail, "description": "Unauthorized. Invalid or missing token."},
+                 429: {"model": ErrorResponseDetail, "description": "Rate limit exceeded, retry after `Retry-After` seconds."},
+                 503: {"model": ErrorResponseDetail, "description": "Too many exports in progress."}})
+async def export_movies_endpoint(title: str = Query(None, description="Substring to search in movie titles"),
+                                 year: int = Query(None, description="Exact year of the movie"),
+                                 format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="`ndjson` or `csv`")):
+    """
+    Endpoint to export every movie matching the search, in a single streamed response.
+
+    - `title` (optional): Substring to search for in movie titles.
+    - `year` (optional): Filter by exact release year.
+    - `format` (optional, default `ndjson`): One JSON document per line, or CSV with a header row.
+
+    Movies are read from Elasticsearch in batches with the same query as `/search` and written
+    as soon as each batch arrives, so the memory used does not depend on the number of results.
+
+    Requests share the rate limit of `/search`. Exports run up to `EXPORT_MAX_CONCURRENCY` at once
+    per worker, each for as long as it streams, the others wait in a bounded queue and are shed with 503.
+    """
+    batches = export_limiter.hold(scan_movies_util(title=title, year=year))
+
+    # Read the first batch before answering, so Elasticsearch errors still get a proper status code
+    first_batch = await anext(batches, [])
+
+    if format == "csv":
+        return StreamingResponse(csv_chunks(first_batch, batches), media_type="text/csv",
+                                 headers={"Content-Disposition": 'attachment; filename="movies.csv"'})
+
+    return StreamingResponse(ndjson_chunks(first_batch, batches), media_type="application/x-ndjson")
@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 from app.routes.movies import router as movies_router
+from app.routes.admin import router as admin_router
 
 router = APIRouter()
 
 router.include_router(movies_router, prefix="/api/v1/movies", tags=["Movies"])
+router.include_router(admin_router, prefix="/api/v1/admin", tags=["Admin"])
 
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import time
+
+from urllib.parse import urlencode
+from fastapi import Request, Response
+from fastapi_cache import FastAPICache
+from app.config import STALE_SEARCH_TTL, SEARCH_GENERATION_REFRESH
+from app.database import redis_client
+
+logger = logging.getLogger(__name__)
+
+STALE_KEY_PREFIX = "search-stale"
+GENERATION_KEY = "search-generation"
+
+
+def stale_key(request: Request):
+    """
+    Key of the last known result of a request: its path plus its sorted query parameters.
+    """
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f"{STALE_KEY_PREFIX}:{request.url.path}?{query}"
+
+
+async def save_stale_result(request: Request, body: bytes):
+    """
+    Keep the result of a successful search (encoded as JSON) for `STALE_SEARCH_TTL` seconds,
+    so it can be served while Elasticsearch is unreachable. Redis errors never fail the search.
+    """
+    try:
+        await redis_client.setex(stale_key(request), STALE_SEARCH_TTL, body)
+    except Exception:
+        logger.warning("Could not store the stale copy of the search result", exc_info=True)
+
+
+async def get_stale_result(request: Request):
+    """
+    Get the last known result of a request, or `None`.
+    """
+    try:
+        cached = await redis_client.get(stale_key(request))
+    except Exception:
+        logger.warning("Could not read the stale copy of the search result", exc_info=True)
+        return None
+
+    return json.loads(cached) if cached else None
+
+
+class SearchGeneration:
+    """
+    Generation of the indexed movies, part of every cached search key.
+
+    Indexing bumps it with an atomic `INCR`, so every search cached before becomes unreachable
+    at once (in Redis and in every worker's local tier) and simply ages out, instead of the whole
+    cache being deleted. Workers read it again at most every `SEARCH_GENERATION_REFRESH` seconds,
+    and it never goes backwards within a worker, even while Redis is unreachable.
+    """
+    def __init__(self, refresh_interval: float = SEARCH_GENERATION_REFRESH):
+        self.refresh_interval = refresh_interval
+        self.value = 0
+        self.read_at = None
+
+    async def get(self):
+        if self.read_at is None or time.monotonic() - self.read_at >= self.refresh_interval:
+            try:
+                self.value = max(self.value, int(await redis_client.get(GENERATION_KEY) or 0))
+            except Exception:
+                logger.warning("Could not read the search cache generation", exc_info=True)
+            self.read_at = time.monotonic()
+
+        return self.value
+
+    async def bump(self):
+        try:
+            self.value = max(self.value + 1, await redis_client.incr(GENERATION_KEY))
+        except Exception:
+            # Still invalidate this worker's searches, the others catch up once Redis is back
+            logger.warning("Could not bump the search cache generation", exc_info=True)
+            self.value += 1
+        self.read_at = time.monotonic()
+
+        return self.value
+
+
+search_generation = SearchGeneration()
+
+
+async def search_cache_key(namespace: str, params: dict):
+    """
+    Cache key of a search: its namespace, the current search generation and a hash of its parameters.
+    """
+    generation = await search_generation.get()
+    digest = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f"{namespace}:{generation}:{digest}"
+
+
+async def get_cached_search(key: str):
+    """
+    Get the encoded result cached under `key` and its remaining TTL, or `(0, None)`.
+    """
+    try:
+        return await FastAPICache.get_backend().get_with_ttl(key)
+    except Exception:
+        logger.warning(f"Error retrieving cache key '{key}' from backend", exc_info=True)
+        return 0, None
+
+
+async def get_cached_searches(searches: list):
+    """
+    Look up searches (dicts of `/search` parameters) in the fastapi-cache backend.
+
+    Returns their cache keys and their cached results, encoded as JSON (`None` for misses), in order.
+    """
+    namespace = f"{FastAPICache.get_prefix()}:"
+    keys = [await search_cache_key(namespace, search) for search in searches]
+    return keys, [(await get_cached_search(key))[1] for key in keys]
+
+
+async def cache_search(key: str, body: bytes, expire: int):
+    """
+    Store the result of a search, encoded as JSON, under `key`.
+    """
+    try:
+        await FastAPICache.get_backend().set(key, body, expire)
+    except Exception:
+        logger.warning(f"Error setting cache key '{key}' in backend", exc_info=True)
+
+
+async def cached_search_response(request: Request, params: dict, search, expire: int):
+    """
+    Answer a search from the cache, calling `search()` for the JSON-encoded result on a miss.
+
+    The cache holds the encoded response body, so a hit is sent as stored, without decoding nor
+    encoding it again. Headers follow `fastapi_cache.decorator.cache`: `Cache-Control: no-store`
+    bypasses the cache and `no-cache` refreshes it, the response carries `Cache-Control`, an `ETag`
+    (a matching `If-None-Match` gets `304 Not Modified`) and the `X-FastAPI-Cache` HIT/MISS status.
+    """
+    cache_control = request.headers.get("Cache-Control")
+    if cache_control == "no-store":
+        return Response(await search(), media_type="application/json")
+
+    key = await search_cache_key(f"{FastAPICache.get_prefix()}:", params)
+    ttl, body = (0, None) if cache_control == "no-cache" else await get_cached_search(key)
+
+    status = "HIT"
+    if body is None:
+        body = await search()
+        await cache_search(key, body, expire)
+        ttl, status = expire, "MISS"
+
+    headers = {
+        "Cache-Control": f"max-age={ttl}",
+        "ETag": f"W/{hashlib.md5(body).hexdigest()}",
+        FastAPICache.get_cache_status_header(): status
+    }
+    if request.headers.get("If-None-Match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def invalidate_searches():
+    """
+    Make every cached search stale after new movies were indexed.
+    """
+    await search_generation.bump()
@@ -1,29 +1,151 @@
 import jwt
 import os
+import hashlib
+import time
 
+from collections import OrderedDict
 from fastapi import Depends, HTTPException, Security
 from fastapi.security import OAuth2PasswordBearer
+from app.config import JWT_JWKS_FILE, JWT_JWKS_REFRESH, JWT_CACHE_SIZE, JWT_CACHE_TTL, JWT_NEGATIVE_CACHE_TTL
 from app.models import ErrorResponse
+from app.tracing import span
 
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretjwtkey")
 ALGORITHM = "HS256"
 
+TOKEN_ERRORS = {
+    "TOKEN_EXPIRED": "Token has expired.",
+    "INVALID_TOKEN": "Invalid authentication token."
+}
+
    
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-def validate_jwt_token(token: str = Security(oauth2_scheme)):
+
+class TokenCache:
+    """
+    Bounded LRU of verification results keyed by token hash: the payload of a valid token,
+    or the error code of an invalid one. Every entry expires at its own time.
+    """
+    def __init__(self, max_entries: int = JWT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, token_hash: bytes):
+        entry = self.entries.get(token_hash)
+        if entry is None:
+            return None
+
+        expires_at, result = entry
+        if expires_at <= time.time():
+            del self.entries[token_hash]
+            return None
+
+        self.entries.move_to_end(token_hash)
+        return result
+
+    def set(self, token_hash: bytes, result, expires_at: float):
+        self.entries[token_hash] = (expires_at, result)
+        self.entries.move_to_end(token_hash)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class KeyStore:
+    """
+    Keys verifying the tokens.
+
+    Without `JWT_JWKS_FILE`, tokens are signed with `SECRET_KEY` (HS256). Otherwise the file holds a
+    JWKS (e.g. RS256 or EdDSA public keys) and each token is verified with the key named by its `kid`.
+    The file is read again when it changes, checked at most every `JWT_JWKS_REFRESH` seconds or when a
+    token names an unknown key, so keys can be rotated without restarting the app.
+    """
+    def __init__(self, path: str = JWT_JWKS_FILE):
+        self.path = path
+        self.keys = {}
+        self.mtime = None
+        self.checked_at = None
+
+    def load(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self.checked_at is not None and now - self.checked_at < JWT_JWKS_REFRESH:
+            return
+        self.checked_at = now
+
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self.mtime:
+            return
+
+        with open(self.path) as f:
+            jwks = jwt.PyJWKSet.from_json(f.read())
+
+        self.keys = {key.key_id: key for key in jwks.keys}
+        self.mtime = mtime
+
+    def get_key(self, token: str):
+        """
+        Get the key and the algorithms accepted to verify `token`.
+        """
+        if not self.path:
+            return SECRET_KEY, [ALGORITHM]
+
+        kid = jwt.get_unverified_header(token).get("kid")
+
+        self.load()
+        if kid not in self.keys:
+            self.load(force=True)
+
+        key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key {kid}")
+
+        return key.key, [key.algorithm_name]
+
+
+key_store = KeyStore()
+token_cache = TokenCache()
+
+
+def verify_token(token: str):
+    """
+    Verify `token` and cache the result: a valid token until it expires (at most `JWT_CACHE_TTL`
+    seconds), an invalid one for `JWT_NEGATIVE_CACHE_TTL` seconds.
+    """
+    token_hash = hashlib.sha256(token.encode()).digest()
+    result = token_cache.get(token_hash)
+    if result is not None:
+        return result
+
+    now = time.time()
+    with span("jwt.verify"):
+        try:
+            key, algorithms = key_store.get_key(token)
+            result = jwt.decode(token, key, algorithms=algorithms)
+            expires_at = min(result.get("exp", float("inf")), now + JWT_CACHE_TTL)
+        except jwt.ExpiredSignatureError:
+            result, expires_at = "TOKEN_EXPIRED", now + JWT_NEGATIVE_CACHE_TTL
+        except jwt.InvalidTokenError:
+            result, expires_at = "INVALID_TOKEN", now + JWT_NEGATIVE_CACHE_TTL
+
+    token_cache.set(token_hash, result, expires_at)
+    return result
+
+
+async def validate_jwt_token(token: str = Security(oauth2_scheme)):
     """
     Validate JWT token and return user payload or error.
     """
     if not token:
         error = ErrorResponse(code="MISSING_TOKEN", message="Authentication token is required.")
         raise HTTPException(status_code=401, detail=error.model_dump())
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        error = ErrorResponse(code="TOKEN_EXPIRED", message="Token has expired.")
+
+    result = verify_token(token)
+    if isinstance(result, str):
+        error = ErrorResponse(code=result, message=TOKEN_ERRORS[result])
         raise HTTPException(status_code=401, detail=error.model_dump())
-    except jwt.InvalidTokenError:
-        error = ErrorResponse(code="INVALID_TOKEN", message="Invalid authentication token.")
-        raise HTTPException(status_code=401, detail=error.model_dump())
\ No newline at end of file
+
+    return result
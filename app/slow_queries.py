@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+from collections import deque
+from app.database import get_async_es
+from app.config import INDEX_NAME, SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_LOG_SIZE, SLOW_QUERY_PROFILE_RATIO
+
+logger = logging.getLogger(__name__)
+
+
+def nanos_to_ms(nanos: int):
+    return round(nanos / 1_000_000, 3)
+
+
+def summarize_profile(profile: dict):
+    """
+    Reduce the `profile` section of a search response to the time spent on each shard, split
+    between the query (with its top-level clauses), the collectors and the aggregations.
+    """
+    shards = []
+
+    for shard in profile.get("shards", []):
+        queries = [query for search in shard.get("searches", []) for query in search.get("query", [])]
+        collectors = [collector for search in shard.get("searches", []) for collector in search.get("collector", [])]
+        aggregations = shard.get("aggregations", [])
+
+        shards.append({
+            "id": shard.get("id"),
+            "query_ms": nanos_to_ms(sum(query["time_in_nanos"] for query in queries)),
+            "collector_ms": nanos_to_ms(sum(collector["time_in_nanos"] for collector in collectors)),
+            "aggregations_ms": nanos_to_ms(sum(aggregation["time_in_nanos"] for aggregation in aggregations)),
+            "queries": [
+                {"type": query["type"], "description": query["description"], "time_ms": nanos_to_ms(query["time_in_nanos"])}
+                for query in queries
+            ]
+        })
+
+    return shards
+
+
+class SlowQueryLog:
+    """
+    Ring buffer of the last `max_entries` searches slower than `threshold_ms`, as seen by this worker.
+
+    Each entry keeps the request body, the search parameters, the duration measured by the app and
+    the `took` and `_shards` of the response. A `profile_ratio` share of the entries are run again
+    in the background with `profile: true`, adding the time spent on each shard to the entry.
+    """
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS, max_entries: int = SLOW_QUERY_LOG_SIZE,
+                 profile_ratio: float = SLOW_QUERY_PROFILE_RATIO):
+        self.threshold_ms = threshold_ms
+        self.profile_ratio = profile_ratio
+        self.entries = deque(maxlen=max_entries)
+        self.tasks = set()  # Running profiles, referenced so they are not garbage collected
+
+    def record(self, operation: str, body: dict, params: dict, elapsed: float, response: dict):
+        """
+        Record a search which took `elapsed` seconds if it is slow, and maybe schedule its profiling.
+        """
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < self.threshold_ms:
+            return None
+
+        entry = {
+            "id": uuid.uuid4().hex,
+            "timestamp": time.time(),
+            "operation": operation,
+            "params": params,
+            "body": body,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "took_ms": response.get("took"),
+            "shards": response.get("_shards"),
+            "profile": None,
+            "profile_error": None
+        }
+        self.entries.append(entry)
+        logger.warning(f"Slow {operation} ({entry['elapsed_ms']} ms, took {entry['took_ms']} ms): {params}")
+
+        if self.profile_ratio > 0 and random.random() < self.profile_ratio:
+            task = asyncio.create_task(self.profile(entry))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        return entry
+
+    async def profile(self, entry: dict):
+        """
+        Run the search of `entry` again with `profile: true` and store the time spent on each shard.
+        """
+        body = entry["body"]
+        try:
+            response = await get_async_es().search(index=INDEX_NAME, body={**body, "profile": True})
+            entry["profile"] = summarize_profile(response.get("profile", {}))
+        except Exception as e:
+            logger.warning(f"Could not profile slow search {entry['id']}: {e}")
+            entry["profile_error"] = str(e)
+
+    def slowest(self):
+        """
+        Recorded searches, slowest first.
+        """
+        return sorted(self.entries, key=lambda entry: entry["elapsed_ms"], reverse=True)
+
+    def clear(self):
+        self.entries.clear()
+
+
+slow_query_log = SlowQueryLog()
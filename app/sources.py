@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import requests
+
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from fastapi import HTTPException
+from app.config import (
+    MOVIES_API_TIMEOUT, MOVIES_API_MAX_WORKERS, MOVIES_API_RATE_LIMIT, MOVIES_API_MAX_RETRIES, MOVIES_API_BACKOFF,
+    MOVIES_SOURCE, MOVIES_SOURCE_FILE, MOVIES_SOURCE_PAGE_SIZE, MOVIES_CACHE_PATH, MOVIES_CACHE_TTL, MOVIES_CACHE_MAX_BYTES
+)
+from app.metrics import MOVIES_API_REQUEST_SECONDS, MOVIES_API_PAGES
+from app.tracing import span
+
+logger = logging.getLogger(__name__)
+
+MOVIES_API_URL = "https://jsonmock.hackerrank.com/api/moviesdata/search/"
+
+CachedPage = namedtuple("CachedPage", ["etag", "data", "fresh"])
+
+# Titles whose matching offsets an NDJSON source keeps, the least recently fetched being dropped first
+NDJSON_CACHED_TITLES = 8
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to the same host so concurrent workers never exceed `rate` requests per second.
+    """
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, host: str):
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def build_session():
+    """
+    Build the HTTP session shared by every fetch, with a connection pool sized for the workers.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MOVIES_API_MAX_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = build_session()
+rate_limiter = HostRateLimiter(MOVIES_API_RATE_LIMIT)
+
+
+class PageCache:
+    """
+    Pages of the external API kept in a SQLite file, shared by the fetching threads and the worker processes.
+
+    A page younger than `ttl` seconds is used without asking the API. An older one is revalidated
+    with its ETag (`If-None-Match`), a `304 Not Modified` making it fresh again, and is still used
+    when the API cannot be reached. Expired pages without an ETag are dropped, and the least
+    recently used pages are evicted once the pages take more than `max_bytes` (compressed).
+    """
+    def __init__(self, path: str, ttl: int = MOVIES_CACHE_TTL, max_bytes: int = MOVIES_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, etag TEXT, body BLOB NOT NULL, "
+                "size INTEGER NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS pages_used_at ON pages (used_at)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT etag, body, stored_at FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE pages SET used_at = ? WHERE key = ?", (now, key))
+
+        etag, body, stored_at = row
+        return CachedPage(etag, json.loads(zlib.decompress(body)), now - stored_at < self.ttl)
+
+    def set(self, key: str, etag: str, data: dict):
+        body = zlib.compress(json.dumps(data).encode())
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (key, etag, body, size, stored_at, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, etag, body, len(body), now, now)
+            )
+            self.evict(now)
+
+    def revalidated(self, key: str):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("UPDATE pages SET stored_at = ?, used_at = ? WHERE key = ?", (now, now, key))
+
+    def evict(self, now: float):
+        self.connection.execute("DELETE FROM pages WHERE etag IS NULL AND stored_at < ?", (now - self.ttl,))
+
+        excess = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+
+        evicted = []
+        for key, size in self.connection.execute("SELECT key, size FROM pages ORDER BY used_at"):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM pages WHERE key = ?", evicted)
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM pages")
+
+
+class MovieSource(ABC):
+    """
+    Where `index_movies` reads the movies from.
+
+    `fetch_page(title, page)` returns the movies whose title contains `title` a page at a time,
+    in the format of the external API: `page`, `per_page`, `total`, `total_pages` and `data`
+    (movies with `Title`, `Year` and `imdbID`). It is called from several threads at once.
+    """
+    @abstractmethod
+    def fetch_page(self, title: str, page: int):
+        pass
+
+
+class HttpMovieSource(MovieSource):
+    """
+    The Hackerrank external API, optionally behind a `PageCache`.
+
+    Timeouts and 5xx responses are retried up to `MOVIES_API_MAX_RETRIES` times with exponential backoff.
+    """
+    def __init__(self, url: str = MOVIES_API_URL, cache: PageCache = None):
+        self.url = url
+        self.host = urlparse(url).netloc
+        self.cache = cache
+
+    def fetch_page(self, title: str, page: int):
+        key = f"{self.url}?Title={title}&page={page}"
+        cached = self.cache.get(key) if self.cache else None
+        if cached and cached.fresh:
+            return cached.data
+
+        headers = {"If-None-Match": cached.etag} if cached and cached.etag else {}
+        try:
+            response = self.request(title, page, headers)
+        except HTTPException as e:
+            if cached is None:
+                raise
+            logger.warning(f"Using the cached page {page} of '{title}': {e.detail['message']}")
+            return cached.data
+
+        if response.status_code == 304 and cached:
+            self.cache.revalidated(key)
+            return cached.data
+
+        data = response.json()
+        if self.cache:
+            etag = response.headers.get("ETag")
+            self.cache.set(key, etag if isinstance(etag, str) else None, data)
+
+        return data
+
+    def request(self, title: str, page: int, headers: dict):
+        for attempt in range(MOVIES_API_MAX_RETRIES + 1):
+            retries_left = attempt < MOVIES_API_MAX_RETRIES
+            rate_limiter.acquire(self.host)
+
+            try:
+                with MOVIES_API_REQUEST_SECONDS.time(), span("movies_api.fetch", page=page, attempt=attempt):
+                    response = session.get(
+                        self.url,
+                        params={"Title": title, "page": page},
+                        headers=headers,
+                        timeout=MOVIES_API_TIMEOUT  # Set a timeout to avoid hanging requests
+                    )
+
+                if response.status_code >= 500 and retries_left:
+                    time.sleep(MOVIES_API_BACKOFF * 2 ** attempt)
+                    continue
+
+                response.raise_for_status()  # Raise an error for HTTP 4xx/5xx status codes
+
+                MOVIES_API_PAGES.inc()
+                return response
+
+            except requests.Timeout:
+                if retries_left:
+                    time.sleep(MOVIES_API_BACKOFF * 2 ** attempt)
+                    continue
+
+                raise HTTPException(
+                    status_code=504,
+                    detail={"code": "EXTERNAL_API_TIMEOUT", "message": "The external API request timed out."}
+                ) from None
+
+            except requests.RequestException as e:
+                raise HTTPException(
+                    status_code=502,
+                    detail={"code": "EXTERNAL_API_ERROR", "message": f"Error getting data from external API: {str(e)}"}
+                ) from None
+
+
+class NdjsonMovieSource(MovieSource):
+    """
+    A local dump of movies, one JSON object (`Title`, `Year`, `imdbID`) per line, served in pages of `per_page`.
+
+    The dump is never held in memory: the first page of a title scans the file once, keeping only the
+    byte offsets of the matching lines, and every page then reads its own lines. The offsets of the
+    last `max_titles` titles are kept, so loads of different titles can interleave, and are built
+    again when the file changes. Titles are matched case-insensitively, like the external API.
+    """
+    def __init__(self, path: str, per_page: int = MOVIES_SOURCE_PAGE_SIZE, max_titles: int = NDJSON_CACHED_TITLES):
+        self.path = path
+        self.per_page = per_page
+        self.max_titles = max_titles
+        self.lock = threading.Lock()
+        self.offsets = OrderedDict()  # Offsets of the matching lines per title and file mtime, oldest first
+
+    def fetch_page(self, title: str, page: int):
+        offsets = self.find(title)
+        total_pages = -(-len(offsets) // self.per_page)
+        start = (page - 1) * self.per_page
+
+        data = []
+        with open(self.path, "rb") as file:
+            for offset in offsets[start:start + self.per_page]:
+                file.seek(offset)
+                data.append(json.loads(file.readline()))
+
+        return {
+            "page": page,
+            "per_page": self.per_page,
+            "total": len(offsets),
+            "total_pages": total_pages,
+            "data": data
+        }
+
+    def find(self, title: str):
+        with self.lock:
+            key = (title, os.stat(self.path).st_mtime)
+            if key in self.offsets:
+                self.offsets.move_to_end(key)
+                return self.offsets[key]
+
+            needle = title.lower()
+            offsets = array("q")
+            offset = 0
+            with open(self.path, "rb") as file:
+                for line in file:
+                    if line.strip() and needle in json.loads(line)["Title"].lower():
+                        offsets.append(offset)
+                    offset += len(line)
+
+            self.offsets[key] = offsets
+            if len(self.offsets) > self.max_titles:
+                self.offsets.popitem(last=False)
+
+            return offsets
+
+
+def build_movie_source():
+    """
+    The source configured by `MOVIES_SOURCE`: "ndjson" reads `MOVIES_SOURCE_FILE`, anything else the external API
+    (with its pages cached in `MOVIES_CACHE_PATH`, if set).
+
+    Built on import, so a missing `MOVIES_SOURCE_FILE` stops the app at startup rather than failing the first load.
+    """
+    if MOVIES_SOURCE == "ndjson":
+        if not MOVIES_SOURCE_FILE:
+            raise ValueError("MOVIES_SOURCE=ndjson requires MOVIES_SOURCE_FILE, the path of the NDJSON dump")
+        return NdjsonMovieSource(MOVIES_SOURCE_FILE)
+
+    return HttpMovieSource(cache=PageCache(MOVIES_CACHE_PATH) if MOVIES_CACHE_PATH else None)
+
+
+movie_source = build_movie_source()
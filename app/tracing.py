@@ -0,0 +1,82 @@
+import logging
+
+from contextlib import contextmanager, nullcontext
+from app.config import TRACING_ENABLED, TRACING_EXPORTER, TRACING_SAMPLE_RATIO, TRACING_SERVICE_NAME
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import propagate, trace
+except ImportError:  # Tracing is optional, spans are no-ops without OpenTelemetry
+    propagate = trace = None
+
+# Set by `setup_tracing`, `None` while tracing is disabled
+tracer = None
+
+
+def setup_tracing():
+    """
+    Export spans with the OTLP exporter (to `OTEL_EXPORTER_OTLP_ENDPOINT`) or to the console,
+    keeping `TRACING_SAMPLE_RATIO` of the traces started here (the decision of the caller is
+    followed for traces propagated with `traceparent`).
+    """
+    global tracer
+    if not TRACING_ENABLED or tracer is not None:
+        return
+
+    if trace is None:
+        logger.warning("TRACING_ENABLED is set but OpenTelemetry is not installed, tracing stays disabled")
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if TRACING_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO))
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    tracer = trace.get_tracer("app")
+
+
+def shutdown_tracing():
+    if tracer is not None:
+        trace.get_tracer_provider().shutdown()
+
+
+def span(name: str, **attributes):
+    """
+    Context manager timing a block as a child span of the current one, a no-op while tracing is disabled.
+    """
+    if tracer is None:
+        return nullcontext()
+    return tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def server_span(scope: dict):
+    """
+    Root span of an HTTP request, continuing the trace of the caller if it sent a `traceparent` header.
+    """
+    if tracer is None:
+        yield None
+        return
+
+    carrier = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+    with tracer.start_as_current_span(
+        f"{scope['method']} {scope['path']}",
+        context=propagate.extract(carrier),
+        kind=trace.SpanKind.SERVER,
+        attributes={"http.request.method": scope["method"], "url.path": scope["path"]}
+    ) as current:
+        yield current
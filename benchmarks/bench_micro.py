@@ -0,0 +1,111 @@
+"""
+Microbenchmarks of the hot paths of a request, with pytest-benchmark:
+
+    pytest benchmarks/bench_micro.py
+    pytest benchmarks/bench_micro.py --benchmark-save=before  # then --benchmark-compare after a change
+"""
+import asyncio
+import json
+import time
+
+import jwt
+import orjson
+import pytest
+
+from fastapi.encoders import jsonable_encoder
+
+from app.cache import LocalCache
+from app.elastic_utils import build_movie_doc, build_search_query, search_result
+from app.middleware.error_handler import ErrorHandlerMiddleware
+from app.middleware.idempotency import IdempotencyMiddleware
+from app.models import MovieSearchResponse
+from app.security import ALGORITHM, SECRET_KEY, token_cache, verify_token
+from benchmarks.fakes import FakeMoviesSession
+
+MOVIES = FakeMoviesSession(total=100, per_page=100).get(None, params={"Title": "Matrix", "page": 1}).json()["data"]
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_build_search_query(benchmark):
+    benchmark(build_search_query, "The Matrix", 1999)
+
+
+def test_build_search_query_short_title(benchmark):
+    benchmark(build_search_query, "Ma", None)
+
+
+def test_search_result(benchmark):
+    response = {
+        "hits": {"total": {"value": 1000}, "hits": [{"_source": movie, "sort": [1.0, movie["imdbID"]]} for movie in MOVIES[:10]]},
+        "aggregations": {"years": {"buckets": [{"key": 1999, "doc_count": 10}]}}
+    }
+    benchmark(search_result, response, "Matrix", None, 1, 10)
+
+
+@pytest.fixture(scope="module")
+def search_page():
+    response = {"hits": {"total": {"value": 1000}, "hits": [{"_source": movie, "sort": [1.0, movie["imdbID"]]} for movie in MOVIES]}}
+    return search_result(response, "Matrix", None, 1, 100)
+
+
+def test_encode_search_response_model(benchmark, search_page):
+    """
+    Encoding of a 100-hit page through the response model, as FastAPI does for a returned model.
+    """
+    benchmark(lambda: json.dumps(jsonable_encoder(MovieSearchResponse(**search_page))).encode())
+
+
+def test_encode_search_response_orjson(benchmark, search_page):
+    benchmark(orjson.dumps, search_page)
+
+
+def test_build_movie_docs(benchmark):
+    benchmark(lambda: [build_movie_doc(movie) for movie in MOVIES])
+
+
+def test_verify_token_cached(benchmark):
+    token = jwt.encode({"sub": "benchmark", "exp": int(time.time()) + 3600}, SECRET_KEY, algorithm=ALGORITHM)
+    verify_token(token)
+    benchmark(verify_token, token)
+
+
+def test_verify_token_uncached(benchmark):
+    token = jwt.encode({"sub": "benchmark", "exp": int(time.time()) + 3600}, SECRET_KEY, algorithm=ALGORITHM)
+
+    def verify():
+        token_cache.clear()
+        verify_token(token)
+
+    benchmark(verify)
+
+
+def test_local_cache_hit(benchmark):
+    cache = LocalCache(max_entries=1024, max_bytes=1024 * 1024, ttl=60)
+    cache.set("key", b"x" * 2048)
+    benchmark(cache.get_with_ttl, "key")
+
+
+def test_middleware_stack(benchmark, loop):
+    """
+    Overhead of the middlewares around a request without Idempotency-Key.
+    """
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    app = ErrorHandlerMiddleware(IdempotencyMiddleware(endpoint))
+    scope = {"type": "http", "method": "GET", "path": "/api/v1/movies/search", "headers": [(b"authorization", b"Bearer token")]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    benchmark(lambda: loop.run_until_complete(app(scope, receive, send)))
@@ -0,0 +1,325 @@
+"""
+In-memory stand-ins for Elasticsearch, Redis and the external movies API.
+
+They implement just enough of each client for the app to run end to end in one process,
+so benchmarks measure the app itself. `install_fakes()` wires them into the app modules.
+"""
+import fnmatch
+import json
+import zlib
+
+from elastic_transport import ObjectApiResponse
+from elasticsearch import NotFoundError
+from elasticsearch.serializer import JsonSerializer
+
+
+def field_value(doc: dict, field: str):
+    # Subfields (`Title.ngram`, `Title.keyword`) are matched against their parent field
+    return doc.get(field.split(".", 1)[0])
+
+
+def matches(doc: dict, query: dict):
+    """
+    Evaluate the subset of the query DSL built by `build_search_query` against a document.
+    """
+    if not query or "match_all" in query:
+        return True
+
+    if "bool" in query:
+        clauses = query["bool"].get("must", []) + query["bool"].get("filter", [])
+        return all(matches(doc, clause) for clause in clauses)
+
+    (kind, spec), = query.items()
+    (field, value), = spec.items()
+    actual = field_value(doc, field)
+
+    if kind == "match_phrase":
+        return str(value).lower() in str(actual or "").lower()
+    if kind == "wildcard":
+        pattern = value["value"].replace("\\*", "[*]").replace("\\?", "[?]")
+        return fnmatch.fnmatch(str(actual or "").lower(), pattern.lower())
+    if kind == "term":
+        return actual == value
+
+    raise NotImplementedError(f"Unsupported query: {query}")
+
+
+def aggregate(docs: list, aggs: dict):
+    years = [doc.get("Year") for doc in docs if doc.get("Year") is not None]
+    result = {}
+
+    for name, spec in aggs.items():
+        (kind, params), = spec.items()
+        if kind == "terms":
+            result[name] = {"buckets": [{"key": y, "doc_count": years.count(y)} for y in sorted(set(years))]}
+        elif kind == "histogram":
+            interval = params["interval"]
+            keys = sorted({y // interval * interval for y in years})
+            result[name] = {"buckets": [
+                {"key": float(k), "doc_count": sum(1 for y in years if k <= y < k + interval)} for k in keys
+            ]}
+        elif kind in ("min", "max"):
+            result[name] = {"value": float(min(years) if kind == "min" else max(years)) if years else None}
+
+    return result
+
+
+class FakeIndices:
+    def __init__(self, es):
+        self.es = es
+
+    async def exists(self, index):
+        return bool(self.es.resolve(index))
+
+    async def exists_alias(self, name):
+        return name in self.es.aliases
+
+    async def get_alias(self, index=None, name=None, **kwargs):
+        if name is not None:
+            if name not in self.es.aliases:
+                raise NotFoundError("alias_missing", meta=None, body={})
+            return {i: {"aliases": {name: {}}} for i in self.es.aliases[name]}
+
+        return {
+            i: {"aliases": {alias: {} for alias, members in self.es.aliases.items() if i in members}}
+            for i in self.es.docs if fnmatch.fnmatchcase(i, index)
+        }
+
+    async def update_aliases(self, actions):
+        for action in actions:
+            (op, spec), = action.items()
+            if op == "add":
+                self.es.aliases.setdefault(spec["alias"], set()).add(spec["index"])
+            elif op == "remove":
+                self.es.aliases[spec["alias"]].discard(spec["index"])
+            elif op == "remove_index":
+                self.es.docs.pop(spec["index"])
+        self.es.aliases = {alias: members for alias, members in self.es.aliases.items() if members}
+        return {"acknowledged": True}
+
+    async def create(self, index, settings=None, mappings=None, aliases=None, **kwargs):
+        self.es.docs[index] = {}
+        self.es.settings[index] = {"mappings": mappings or {}, "index": {}}
+        for alias in aliases or {}:
+            self.es.aliases.setdefault(alias, set()).add(index)
+        return {"acknowledged": True}
+
+    async def delete(self, index, **kwargs):
+        self.es.docs.pop(index, None)
+        for members in self.es.aliases.values():
+            members.discard(index)
+        return {"acknowledged": True}
+
+    async def get_mapping(self, index, **kwargs):
+        return {i: {"mappings": self.es.settings[i]["mappings"]} for i in self.es.resolve(index)}
+
+    async def get_settings(self, index, **kwargs):
+        return {i: {"settings": {"index": dict(self.es.settings[i]["index"])}} for i in self.es.resolve(index)}
+
+    async def put_settings(self, index, settings, **kwargs):
+        for i in self.es.resolve(index):
+            self.es.settings[i]["index"].update(settings.get("index", {}))
+        return {"acknowledged": True}
+
+    async def refresh(self, index=None, **kwargs):
+        return {}
+
+    async def forcemerge(self, index=None, **kwargs):
+        return {}
+
+
+class FakeElasticsearch:
+    """
+    Async Elasticsearch client keeping documents in dicts, one per index.
+    """
+    def __init__(self):
+        self.docs = {}
+        self.settings = {}
+        self.aliases = {}
+        self.pits = {}
+        self.pit_count = 0
+        self.indices = FakeIndices(self)
+        # Used by the bulk helpers to serialize actions
+        self.transport = type("Transport", (), {"serializers": type("Serializers", (), {
+            "get_serializer": staticmethod(lambda mimetype: JsonSerializer())
+        })()})()
+        self._client_meta = ()
+
+    def options(self, **kwargs):
+        return self
+
+    def resolve(self, index):
+        if index in self.aliases:
+            return sorted(self.aliases[index])
+        return [index] if index in self.docs else []
+
+    async def ping(self, **kwargs):
+        return True
+
+    async def close(self):
+        pass
+
+    async def bulk(self, operations, **kwargs):
+        lines = [json.loads(op) if isinstance(op, (str, bytes)) else op for op in operations]
+        items = []
+
+        for meta, doc in zip(lines[::2], lines[1::2]):
+            (op, info), = meta.items()
+            index = self.resolve(info["_index"])[0]
+            created = info["_id"] not in self.docs[index]
+            self.docs[index][info["_id"]] = doc
+            items.append({op: {"_index": index, "_id": info["_id"], "status": 201 if created else 200}})
+
+        return ObjectApiResponse(body={"took": 1, "errors": False, "items": items}, meta=None)
+
+    async def open_point_in_time(self, index, keep_alive, **kwargs):
+        self.pit_count += 1
+        pit_id = f"pit-{self.pit_count}"
+        self.pits[pit_id] = index
+        return {"id": pit_id}
+
+    async def close_point_in_time(self, id, **kwargs):
+        self.pits.pop(id, None)
+        return {"succeeded": True}
+
+    async def search(self, index=None, query=None, from_=0, size=10, sort=None, search_after=None, pit=None,
+                     aggs=None, **kwargs):
+        if pit:
+            if pit["id"] not in self.pits:
+                raise NotFoundError("search_context_missing_exception", meta=None, body={})
+            index = self.pits[pit["id"]]
+
+        docs = sorted(
+            ((doc_id, doc) for name in self.resolve(index) for doc_id, doc in self.docs[name].items() if matches(doc, query)),
+            key=lambda item: item[1].get("imdbID") or ""
+        )
+        hits = [{"_id": doc_id, "_score": 1.0, "_source": doc, "sort": [1.0, doc.get("imdbID")]} for doc_id, doc in docs]
+
+        if search_after:
+            hits = [hit for hit in hits if (hit["sort"][1] or "") > search_after[-1]]
+            from_ = 0
+
+        body = {"took": 1, "timed_out": False, "hits": {"total": {"value": len(docs), "relation": "eq"}, "hits": hits[from_:from_ + size]}}
+        if aggs:
+            body["aggregations"] = aggregate([doc for _, doc in docs], aggs)
+        if pit:
+            body["pit_id"] = pit["id"]
+
+        return body
+
+    async def msearch(self, searches, **kwargs):
+        responses = []
+        for header, body in zip(searches[::2], searches[1::2]):
+            responses.append(await self.search(
+                index=header["index"], query=body["query"], from_=body.get("from", 0), size=body.get("size", 10),
+                sort=body.get("sort"), aggs=body.get("aggs")
+            ))
+        return {"took": 1, "responses": responses}
+
+
+class FakeRedis:
+    """
+    Async Redis client with the commands used by the app, keeping strings and hashes in a dict (expiry is ignored).
+    """
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, nx=False, ex=None, **kwargs):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+        return True
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    async def hmget(self, key, fields):
+        return [self.data.get(key, {}).get(field) for field in fields]
+
+    async def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def exists(self, *keys):
+        return sum(key in self.data for key in keys)
+
+    async def ping(self):
+        return True
+
+    async def aclose(self):
+        pass
+
+
+class FakeMoviesResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, body: dict):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeMoviesSession:
+    """
+    Stands in for the `requests.Session` of the external movies API: `total` movies per title, 10 per page.
+    """
+    def __init__(self, total: int = 100, per_page: int = 10):
+        self.total = total
+        self.per_page = per_page
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        title, page = params.get("Title") or "Movie", int(params.get("page", 1))
+        total_pages = -(-self.total // self.per_page)
+        start = (page - 1) * self.per_page
+        data = [
+            {"Title": f"{title} {i}", "Year": 1950 + i % 75, "imdbID": f"tt{zlib.crc32(title.encode()) % 10 ** 6:06}{i:05}"}
+            for i in range(start, min(start + self.per_page, self.total))
+        ]
+        return FakeMoviesResponse({"page": page, "per_page": self.per_page, "total": self.total, "total_pages": total_pages, "data": data})
+
+
+def install_fakes(movies_per_title: int = 100):
+    """
+    Point the app at in-memory fakes of Elasticsearch, Redis and the external movies API.
+    Must be called after importing `app.main` and before the app starts.
+    """
+    import app.admission
+    import app.database
+    import app.fingerprints
+    import app.jobs
+    import app.middleware.idempotency
+    import app.routes.health
+    import app.search_cache
+    import app.sources
+
+    es, redis = FakeElasticsearch(), FakeRedis()
+
+    app.database._async_es = es
+    for module in (app.database, app.fingerprints, app.jobs, app.middleware.idempotency, app.routes.health, app.search_cache):
+        module.redis_client = redis
+
+    # A single benchmark user would be throttled by its rate limit (a Redis script the fake cannot run)
+    for budget in (app.admission.search_budget, app.admission.index_budget):
+        budget.bucket.rate = 0
+
+    app.sources.movie_source = app.sources.HttpMovieSource()
+    app.sources.session = FakeMoviesSession(movies_per_title)
+    app.sources.rate_limiter = app.sources.HostRateLimiter(0)
+
+    return es, redis
@@ -0,0 +1,172 @@
+"""
+Async load generator for the API, running the ASGI app in-process.
+
+By default Elasticsearch, Redis and the external movies API are in-memory fakes, so the numbers
+measure the app alone. With `--real`, the app uses `ELASTICSEARCH_URL` and `REDIS_URL` as configured.
+
+    python -m benchmarks.load --requests 2000 --concurrency 50
+    python -m benchmarks.load --scenario search-uncached --real
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+
+import httpx
+import jwt
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+# Titles indexed before the run, and searched during it
+TITLES = ["Matrix", "Star", "Love", "War", "Night", "King", "Dead", "Man"]
+
+
+def search_cached(i: int):
+    # A small set of searches, served from the cache after their first request
+    title = TITLES[i % len(TITLES)]
+    return "GET", f"/api/v1/movies/search?title={title}&page=1&size=10", {}
+
+
+def search_uncached(i: int):
+    # Cache bypassed: every request reaches Elasticsearch
+    title = random.choice(TITLES)
+    return "GET", f"/api/v1/movies/search?title={title}&page={random.randint(1, 5)}&size=10", {"Cache-Control": "no-cache"}
+
+
+def search_aggs(i: int):
+    title = random.choice(TITLES)
+    return "GET", f"/api/v1/movies/search?title={title}&size=0&aggs=years&aggs=year_range", {"Cache-Control": "no-cache"}
+
+
+def search_batch(i: int):
+    body = [{"title": random.choice(TITLES), "page": random.randint(1, 5)} for _ in range(5)]
+    return "POST", "/api/v1/movies/search/batch", {"json": body}
+
+
+def index(i: int):
+    return "POST", f"/api/v1/movies/index?title={random.choice(TITLES)}&page=1&wait=true", {}
+
+
+def index_delta(i: int):
+    # Crawls of titles already indexed: only changed movies are written
+    return "POST", f"/api/v1/movies/index?title={random.choice(TITLES)}&page=1&wait=true&delta=true", {}
+
+
+SCENARIOS = {
+    "search-cached": search_cached,
+    "search-uncached": search_uncached,
+    "search-aggs": search_aggs,
+    "search-batch": search_batch,
+    "index": index,
+    "index-delta": index_delta,
+}
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1] if len(values) > 1 else values[0]
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, requests: int, concurrency: int, token: str):
+    """
+    Send `requests` requests of a scenario, `concurrency` at a time, and measure their latency.
+    """
+    build_request = SCENARIOS[name]
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, url, options = build_request(i)
+            headers = {"Authorization": f"Bearer {token}"}
+            if "json" not in options:
+                headers.update(options)
+                options = {}
+
+            start = time.perf_counter()
+            response = await client.request(method, url, headers=headers, **options)
+            latencies.append(time.perf_counter() - start)
+
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "errors": errors,
+        "req_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+    }
+
+
+async def main(args):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    from app.main import app, lifespan
+    from app.cache import TieredBackend
+    from app.elastic_utils import index_movies
+    from app.security import SECRET_KEY, ALGORITHM
+
+    if not args.real:
+        from benchmarks.fakes import install_fakes
+        install_fakes(movies_per_title=args.movies_per_title)
+        # Same cache tiers as production, with an in-memory shared tier instead of Redis
+        FastAPICache.init(TieredBackend(InMemoryBackend()), prefix="fastapi-cache")
+
+    token = jwt.encode({"sub": "benchmark", "exp": int(time.time()) + 3600}, SECRET_KEY, algorithm=ALGORITHM)
+
+    async with lifespan(app):
+        await app.state.es_init
+
+        if not args.real or args.seed:
+            for title in TITLES:
+                await index_movies(title, 1)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+            results = []
+            for name in scenarios:
+                requests = args.requests if not name.startswith("index") else max(args.requests // 100, 1)
+                # Warm-up: connections, caches and lazy imports
+                await run_scenario(client, name, min(requests, 50), min(args.concurrency, 10), token)
+                results.append(await run_scenario(client, name, requests, args.concurrency, token))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = ["scenario", "requests", "errors", "req_per_s", "p50_ms", "p95_ms", "p99_ms", "mean_ms"]
+    print("  ".join(f"{column:>16}" for column in columns))
+    for result in results:
+        print("  ".join(f"{result[column]:>16}" for column in columns))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the API in-process.")
+    parser.add_argument("--scenario", choices=["all", *SCENARIOS], default="all")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario (indexing runs 1%%)")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight")
+    parser.add_argument("--movies-per-title", type=int, default=200, help="Movies returned by the fake movies API")
+    parser.add_argument("--real", action="store_true", help="Use the configured Elasticsearch and Redis")
+    parser.add_argument("--seed", action="store_true", help="Index the titles before the run (always done with the fakes)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,49 @@
+import os
+import pytest
+
+from unittest.mock import patch
+
+# Must be set before `app.config` is imported by any test module
+os.environ["INDEX_NAME"] = "movies_test"
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the Redis hash commands used by the movie fingerprints.
+    """
+    def __init__(self):
+        self.data = {}
+
+    async def hmget(self, key, fields):
+        return [self.data.get(key, {}).get(field) for field in fields]
+
+    async def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+
+@pytest.fixture
+def fingerprint_redis():
+    """
+    Keeps the movie fingerprints in a `FakeRedis` instead of Redis.
+    """
+    with patch("app.fingerprints.redis_client", FakeRedis()) as fake:
+        yield fake
+
+
+@pytest.fixture
+def mock_external_api():
+    """
+    Mock response from the external movie API.
+    """
+    return {
+        "page": 1,
+        "per_page": 10,
+        "total": 3,
+        "total_pages": 1,
+        "data": [
+            {"Title": "The Matrix", "Year": 1999, "imdbID": "tt0133093"},
+            {"Title": "The Matrix Reloaded", "Year": 2003, "imdbID": "tt0234215"},
+            {"Title": "The Matrix Revolutions", "Year": 2003, "imdbID": "tt0242653"}
+        ]
+    }
@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+
+from unittest.mock import AsyncMock, patch
+from fastapi import HTTPException
+from app.admission import Budget, ConcurrencyLimiter
+
+
+def test_concurrency_limiter_queues_then_sheds():
+    """
+    Tests calls past the limit wait for a slot in order, and are shed with 503 once the queue is full.
+    """
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, queue_timeout=5)
+    order = []
+
+    async def call(name: str, release: asyncio.Event):
+        async with limiter.slot():
+            order.append(name)
+            await release.wait()
+
+    async def run():
+        first, second = asyncio.Event(), asyncio.Event()
+        tasks = [asyncio.create_task(call("first", first)), asyncio.create_task(call("second", second))]
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as rejected:
+            await limiter.acquire()
+
+        first.set()
+        second.set()
+        await asyncio.gather(*tasks)
+        return rejected.value
+
+    rejected = asyncio.run(run())
+
+    assert order == ["first", "second"]
+    assert (rejected.status_code, rejected.detail["code"]) == (503, "OVERLOADED")
+    assert rejected.headers == {"Retry-After": "5"}
+    assert (limiter.active, len(limiter.waiters)) == (0, 0)
+
+
+def test_concurrency_limiter_queue_timeout():
+    """
+    Tests a call waiting longer than `queue_timeout` is shed and leaves the queue.
+    """
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=10, queue_timeout=0.01)
+
+    async def run():
+        await limiter.acquire()
+        with pytest.raises(HTTPException) as rejected:
+            await limiter.acquire()
+        limiter.release()
+        return rejected.value
+
+    assert asyncio.run(run()).status_code == 503
+    assert (limiter.active, len(limiter.waiters)) == (0, 0)
+
+
+def test_rate_limit_per_subject():
+    """
+    Tests a subject with an empty token bucket gets 429 with the seconds to wait in `Retry-After`,
+    and that Redis errors let requests through.
+    """
+    budget = Budget("test", rate=1, burst=1, concurrency=1, max_queue=0, queue_timeout=1)
+
+    with patch.object(budget.bucket, "script", AsyncMock(side_effect=[b"0", b"1.2"])) as mock_script:
+        asyncio.run(budget.limit_rate({"sub": "user"}))
+        with pytest.raises(HTTPException) as rejected:
+            asyncio.run(budget.limit_rate({"sub": "user"}))
+
+    assert mock_script.call_args.kwargs["keys"] == ["rate-limit:test:user"]
+    assert (rejected.value.status_code, rejected.value.detail["code"]) == (429, "RATE_LIMITED")
+    assert rejected.value.headers == {"Retry-After": "2"}
+
+    with patch.object(budget.bucket, "script", AsyncMock(side_effect=ConnectionError("redis down"))):
+        asyncio.run(budget.limit_rate({"sub": "user"}))
+
+
+def test_concurrency_limiter_holds_slot_while_streaming():
+    """
+    Tests a streamed iteration keeps its slot until it is exhausted, shedding the streams started meanwhile.
+    """
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=0, queue_timeout=1)
+
+    async def batches():
+        for batch in ([1], [2]):
+            yield batch
+
+    async def run():
+        stream = limiter.hold(batches())
+        first = await anext(stream)
+
+        with pytest.raises(HTTPException) as rejected:
+            await anext(limiter.hold(batches()))
+
+        rest = [batch async for batch in stream]
+        return first, rest, rejected.value
+
+    first, rest, rejected = asyncio.run(run())
+
+    assert (first, rest) == ([1], [[2]])
+    assert rejected.status_code == 503
+    assert limiter.active == 0
+
+
+def test_rate_limit_charge_capped_to_burst():
+    """
+    Tests a request costing more than the burst takes the whole bucket instead of never fitting in it.
+    """
+    budget = Budget("test", rate=1, burst=5, concurrency=1, max_queue=0, queue_timeout=1)
+
+    with patch.object(budget.bucket, "script", AsyncMock(return_value=b"0")) as mock_script:
+        asyncio.run(budget.charge({"sub": "user"}, 3))
+        asyncio.run(budget.charge({"sub": "user"}, 50))
+
+    assert [call.kwargs["args"] for call in mock_script.call_args_list] == [[1, 5, 3], [1, 5, 5]]
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+
+from unittest.mock import AsyncMock, patch
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from app.cache import LocalCache, SingleFlight, TieredBackend
+from app.search_cache import SearchGeneration
+
+
+def test_local_cache_evicts_least_recently_used():
+    """
+    Tests the local tier evicts the least recently used entry once it holds too many entries.
+    """
+    cache = LocalCache(max_entries=2, max_bytes=1024, ttl=60)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get_with_ttl("a")
+    cache.set("c", b"3")
+
+    assert cache.get_with_ttl("b") == (0, None)
+    assert cache.get_with_ttl("a")[1] == b"1"
+    assert cache.get_with_ttl("c")[1] == b"3"
+    assert cache.stats() == {"entries": 2, "bytes": 2, "hits": 3, "misses": 1, "evictions": 1}
+
+
+def test_local_cache_memory_cap_and_ttl():
+    """
+    Tests the local tier stays under its byte budget and drops expired entries.
+    """
+    cache = LocalCache(max_entries=10, max_bytes=10, ttl=60)
+    cache.set("a", b"x" * 6)
+    cache.set("b", b"x" * 6)
+    cache.set("too-big", b"x" * 11)
+
+    assert cache.size == 6
+    assert list(cache.entries) == ["b"]
+
+    with patch("app.cache.time.monotonic", return_value=cache.entries["b"][0] + 1):
+        assert cache.get_with_ttl("b") == (0, None)
+    assert cache.size == 0
+
+
+@pytest.mark.asyncio
+async def test_tiered_backend_serves_hits_locally():
+    """
+    Tests entries read from the shared backend are then served from the local tier.
+    """
+    remote = InMemoryBackend()
+    await remote.set("fastapi-cache:key", b"cached", 300)
+    backend = TieredBackend(remote, LocalCache(max_entries=10, max_bytes=1024, ttl=30))
+
+    assert (await backend.get_with_ttl("fastapi-cache:key"))[1] == b"cached"
+    await remote.clear(key="fastapi-cache:key")
+
+    ttl, value = await backend.get_with_ttl("fastapi-cache:key")
+    assert value == b"cached"
+    assert 0 < ttl <= 30
+    assert backend.stats()["remote"] == {"hits": 1, "misses": 0}
+
+    await backend.clear(namespace="fastapi-cache")
+    assert await backend.get("fastapi-cache:key") is None
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    """
+    Tests concurrent calls with the same key run once and share the result.
+    """
+    flight = SingleFlight()
+    calls = []
+
+    async def search():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"total_results": 1}
+
+    results = await asyncio.gather(*(flight.run(("Matrix", None, 1, 10, None), search) for _ in range(5)))
+
+    assert results == [{"total_results": 1}] * 5
+    assert len(calls) == 1
+    assert flight.coalesced == 4
+    assert flight.calls == {}
+
+
+@pytest.mark.asyncio
+async def test_search_generation_bump():
+    """
+    Tests bumping the generation changes the cache keys, and keeps doing so while Redis is unreachable.
+    """
+    generation = SearchGeneration(refresh_interval=60)
+
+    with patch("app.search_cache.redis_client") as redis:
+        redis.get = AsyncMock(return_value="4")
+        redis.incr = AsyncMock(return_value=5)
+
+        assert await generation.get() == 4
+        assert await generation.bump() == 5
+
+        redis.incr.side_effect = ConnectionError("Redis down")
+        assert await generation.bump() == 6
+        assert await generation.get() == 6
+        redis.get.assert_awaited_once()
@@ -0,0 +1,100 @@
+import pytest
+
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from app.elastic_utils import disable_refresh, restore_refresh
+from app.jobs import IndexJobManager
+from app.mappings import INDEX_SETTINGS
+
+
+async def bulk_all_ok(client, actions, **kwargs):
+    """
+    Stands in for `async_streaming_bulk`, reporting every action as indexed.
+    """
+    async for action in actions:
+        yield True, {"index": action}
+
+
+@pytest.fixture(autouse=True)
+def init_test_cache():
+    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("fingerprint_redis")
+@patch("app.elastic_utils.live_index", AsyncMock(return_value="movies_test"))
+@patch("app.elastic_utils.create_index")
+@patch("app.elastic_utils.fetch_movies_from_api")
+@patch("app.elastic_utils.async_streaming_bulk")
+async def test_index_job_completes(mock_streaming_bulk, mock_fetch_movies, mock_create_index, mock_external_api):
+    """
+    Tests a background job reports the progress of the indexing run.
+    """
+    mock_fetch_movies.return_value = mock_external_api
+    mock_streaming_bulk.side_effect = bulk_all_ok
+
+    manager = IndexJobManager(workers=1, use_redis=False)
+    job = await manager.enqueue("Matrix", 1)
+    await manager.queue.join()
+    await manager.stop()
+
+    assert job.status == "completed"
+    assert job.pages_fetched == 1
+    assert job.total_pages == 1
+    assert job.docs_indexed == 3
+    assert job.docs_failed == 0
+    assert job.to_response().eta_seconds is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("fingerprint_redis")
+@patch("app.elastic_utils.live_index", AsyncMock(return_value="movies_test"))
+@patch("app.elastic_utils.create_index")
+@patch("app.elastic_utils.fetch_movies_from_api")
+async def test_index_job_failure(mock_fetch_movies, mock_create_index):
+    """
+    Tests a background job records the error that stopped the indexing run.
+    """
+    mock_fetch_movies.side_effect = Exception("External API down")
+
+    manager = IndexJobManager(workers=1, use_redis=False)
+    job = await manager.enqueue("Matrix", 1)
+    await manager.queue.join()
+    await manager.stop()
+
+    assert job.status == "failed"
+    assert job.error == "External API down"
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_job():
+    """
+    Tests a queued job is cancelled before it runs.
+    """
+    manager = IndexJobManager(workers=0, use_redis=False)
+    job = await manager.enqueue("Matrix", 1)
+
+    cancelled = await manager.cancel(job.job_id)
+
+    assert cancelled.status == "cancelled"
+    assert await manager.cancel("unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_overlapping_loads_restore_configured_refresh():
+    """
+    Tests a load starting while another one has refreshes disabled still restores the configured interval.
+    """
+    es = MagicMock()
+    es.indices.put_settings = AsyncMock()
+    es.indices.refresh = AsyncMock()
+
+    with patch("app.elastic_utils.get_async_es", return_value=es):
+        await disable_refresh()
+        await disable_refresh()
+        await restore_refresh()
+        await restore_refresh()
+
+    intervals = [call.kwargs["settings"]["index"]["refresh_interval"] for call in es.indices.put_settings.await_args_list]
+    assert intervals == ["-1", "-1", INDEX_SETTINGS["refresh_interval"], INDEX_SETTINGS["refresh_interval"]]
@@ -0,0 +1,210 @@
+import asyncio
+import httpx
+import pytest
+
+from unittest.mock import patch
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from app.middleware.idempotency import IdempotencyMiddleware
+from app.middleware.error_handler import ErrorHandlerMiddleware
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the few Redis commands used by the idempotency middleware.
+    """
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+
+    async def set(self, key, value, nx=False, ex=None):
+        self.commands.append(("set", key, nx, ex))
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def test_app(calls):
+    """
+    Minimal app wrapped in the same middlewares as the API.
+    """
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware)
+    app.add_middleware(ErrorHandlerMiddleware)
+    app.state.release = asyncio.Event()
+    app.state.rejected = True
+
+    @app.post("/items", status_code=201)
+    async def create_item():
+        calls.append("items")
+        return {"status": "created", "call": len(calls)}
+
+    @app.post("/slow")
+    async def slow():
+        calls.append("slow")
+        await app.state.release.wait()
+        return {"status": "done"}
+
+    @app.post("/large")
+    async def large():
+        calls.append("large")
+        return {"data": "x" * 100}
+
+    @app.post("/rejected")
+    async def rejected():
+        calls.append("rejected")
+        if app.state.rejected:
+            raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": "1"})
+        return {"status": "accepted"}
+
+    @app.post("/broken")
+    async def broken():
+        calls.append("broken")
+        raise RuntimeError("boom")
+
+    @app.get("/items")
+    async def list_items():
+        return {"items": []}
+
+    @app.get("/fail")
+    async def fail():
+        raise RuntimeError("boom")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"{i}\n"
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    return app
+
+
+@pytest.fixture
+def redis():
+    fake = FakeRedis()
+    with patch("app.middleware.idempotency.redis_client", fake):
+        yield fake
+
+
+def test_idempotency_replays_response(test_app, redis, calls):
+    """
+    Tests a repeated `Idempotency-Key` gets the first response replayed without running the request again.
+    """
+    client = TestClient(test_app)
+
+    first = client.post("/items", headers={"Idempotency-Key": "abc"})
+    second = client.post("/items", headers={"Idempotency-Key": "abc"})
+
+    assert calls == ["items"]
+    assert second.status_code == first.status_code == 201
+    assert second.content == first.content
+    assert second.headers["content-type"] == first.headers["content-type"]
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+    _, key, nx, ex = redis.commands[0]
+    assert key.startswith("idempotency:") and nx and ex > 0
+
+
+@pytest.mark.asyncio
+async def test_idempotency_holds_concurrent_duplicates(test_app, redis, calls):
+    """
+    Tests a duplicate arriving while the first request runs waits for, then replays, its response.
+    """
+    transport = httpx.ASGITransport(app=test_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        headers = {"Idempotency-Key": "abc"}
+        first = asyncio.create_task(client.post("/slow", headers=headers))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(client.post("/slow", headers=headers))
+        await asyncio.sleep(0.05)
+        test_app.state.release.set()
+
+        first, second = await first, await second
+
+    assert calls == ["slow"]
+    assert first.json() == second.json() == {"status": "done"}
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+
+@patch("app.middleware.idempotency.IDEMPOTENCY_MAX_RESPONSE_BYTES", 50)
+def test_idempotency_large_response_not_stored(test_app, redis, calls):
+    """
+    Tests a repeat of a request whose response was too large to store is rejected with 409.
+    """
+    client = TestClient(test_app)
+
+    assert client.post("/large", headers={"Idempotency-Key": "abc"}).status_code == 200
+    response = client.post("/large", headers={"Idempotency-Key": "abc"})
+
+    assert response.status_code == 409
+    assert response.json()["message"] == "Duplicate request detected"
+    assert calls == ["large"]
+
+
+def test_idempotency_releases_key_on_error(test_app, redis, calls):
+    """
+    Tests a request failing with an unexpected error can be retried with the same key.
+    """
+    client = TestClient(test_app, raise_server_exceptions=False)
+
+    assert client.post("/broken", headers={"Idempotency-Key": "abc"}).status_code == 500
+    assert client.post("/broken", headers={"Idempotency-Key": "abc"}).status_code == 500
+    assert calls == ["broken", "broken"]
+
+
+def test_idempotency_releases_key_on_error_response(test_app, redis, calls):
+    """
+    Tests an error response (e.g. 401 or 429) is not replayed: a retry with the same key runs the request.
+    """
+    client = TestClient(test_app)
+
+    assert client.post("/rejected", headers={"Idempotency-Key": "abc"}).status_code == 429
+    test_app.state.rejected = False
+    response = client.post("/rejected", headers={"Idempotency-Key": "abc"})
+
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+    assert calls == ["rejected", "rejected"]
+    assert redis.data  # The successful response is stored
+
+
+def test_idempotency_skips_reads_and_requests_without_key(test_app, redis):
+    """
+    Tests only mutating requests carrying a key reach Redis.
+    """
+    client = TestClient(test_app)
+
+    assert client.get("/items", headers={"Idempotency-Key": "abc"}).status_code == 200
+    assert client.post("/items").status_code == 201
+
+    assert redis.commands == []
+
+
+def test_error_handler_unexpected_error(test_app):
+    """
+    Tests unexpected errors become a 500 JSON error, and streamed responses pass through.
+    """
+    client = TestClient(test_app, raise_server_exceptions=False)
+
+    response = client.get("/fail")
+    assert response.status_code == 500
+    assert response.json()["code"] == "SERVER_ERROR"
+
+    response = client.get("/stream")
+    assert response.status_code == 200
+    assert response.text == "0\n1\n2\n"
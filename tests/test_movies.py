@@ -1,41 +1,71 @@
+import asyncio
+import json
 import os
 import pytest
 
+import requests
+
 from fastapi import HTTPException
 from fastapi_cache import FastAPICache
-from unittest.mock import patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi.testclient import TestClient
-from app.database import es
+from elasticsearch import ConnectionError as ElasticsearchConnectionError
+from app.database import get_es, get_async_es
 from app.config import INDEX_NAME
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
 
 os.environ["INDEX_NAME"] = "movies_test"
 from app.main import app
+from app.admission import search_budget
+from app.elastic_utils import (
+    SEARCH_SORT, build_search_query, create_index, decode_cursor, encode_cursor, fetch_movies_from_api, msearch_movies,
+    scan_movies, search_result
+)
+from app import elastic_utils
+from app.mappings import MAPPING_VERSION, INDEX_SETTINGS, INDEX_MAPPINGS
+from app.jobs import IndexJobManager
+from app.slow_queries import SlowQueryLog
+from app.models import MovieSearchResponse
+
+es = get_es()
+
 
 @pytest.fixture
 def setup_test_index():
     """
-    Creates a temporary Elasticsearch index for testing.
+    Creates a temporary Elasticsearch index for testing, behind the `INDEX_NAME` alias.
     Ensures the index exists before each test and deletes it afterward.
     """
     test_index = os.getenv("INDEX_NAME", "movies_test")
-    
-    if es.indices.exists(index=test_index):
-        es.indices.delete(index=test_index)
 
-    es.indices.create(index=test_index)
+    def delete_test_indices():
+        for index in es.indices.get_alias(index=f"{test_index}*"):
+            es.indices.delete(index=index)
+
+    delete_test_indices()
+
+    es.indices.create(index=f"{test_index}_v1", settings=INDEX_SETTINGS, mappings=INDEX_MAPPINGS, aliases={test_index: {}})
     yield test_index
 
-    es.indices.delete(index=test_index, ignore=[400, 404])
+    delete_test_indices()
+
+
+async def wait_for_startup():
+    await app.state.es_init
 
 
 @pytest.fixture
 def client():
     """
     Creates a synchronous test client for FastAPI.
+    Entering the client runs the lifespan and keeps a single event loop for the async
+    Elasticsearch client (the in-memory cache initialized first is kept).
     """
-    return TestClient(app)
+    with TestClient(app) as test_client:
+        # Let the background index initialization finish so it does not race the index fixtures
+        test_client.portal.call(wait_for_startup)
+        yield test_client
 
 
 @pytest.fixture
@@ -56,22 +86,12 @@ def headers(auth_token):
     return {"Authorization": f"Bearer {auth_token}"}
 
 
-@pytest.fixture
-def mock_external_api():
+async def bulk_results(*results):
     """
-    Mock response from the external movie API.
+    Async iterator standing in for `async_streaming_bulk`.
     """
-    return {
-        "page": 1,
-        "per_page": 10,
-        "total": 3,
-        "total_pages": 1,
-        "data": [
-            {"Title": "The Matrix", "Year": 1999, "imdbID": "tt0133093"},
-            {"Title": "The Matrix Reloaded", "Year": 2003, "imdbID": "tt0234215"},
-            {"Title": "The Matrix Revolutions", "Year": 2003, "imdbID": "tt0242653"}
-        ]
-    }
+    for result in results:
+        yield result
 
 @pytest.fixture(scope="session", autouse=True)
 def init_test_cache():
@@ -84,7 +104,7 @@ def init_test_cache():
 
 @pytest.fixture(autouse=True)
 def clear_cache():
-    FastAPICache.clear()
+    asyncio.run(FastAPICache.clear())
 
 @patch("app.elastic_utils.fetch_movies_from_api")
 def test_index_movies(mock_fetch_movies, client, headers, setup_test_index, mock_external_api):
@@ -93,12 +113,51 @@ def test_index_movies(mock_fetch_movies, client, headers, setup_test_index, mock
     """
     mock_fetch_movies.return_value = mock_external_api  # Mock API response
 
-    response = client.post("/api/v1/movies/index?title=Matrix&page=1", headers=headers)
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true", headers=headers)
 
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "Movies indexed"
     assert data["total_indexed"] == 3  # The mocked API returns 3 movies
+    assert data["created"] == 3
+    assert data["total_failed"] == 0
+    assert data["errors"] == []
+
+
+@patch("app.elastic_utils.fetch_movies_from_api")
+def test_index_movies_delta(mock_fetch_movies, client, headers, setup_test_index, mock_external_api, fingerprint_redis):
+    """
+    Tests a delta load only writes the movies which changed since the previous load.
+    """
+    mock_fetch_movies.return_value = mock_external_api
+
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true", headers=headers)
+    assert response.json()["created"] == 3
+
+    mock_external_api["data"][0] = {**mock_external_api["data"][0], "Title": "The Matrix (Remastered)"}
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true&delta=true", headers=headers)
+
+    data = response.json()
+    assert (data["total_indexed"], data["created"], data["updated"], data["unchanged"]) == (1, 0, 1, 2)
+
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true&delta=true", headers=headers)
+    assert (response.json()["total_indexed"], response.json()["unchanged"]) == (0, 3)
+
+
+@patch("app.elastic_utils.fetch_movies_from_api")
+def test_index_movies_invalidates_cached_searches(mock_fetch_movies, client, headers, setup_test_index, mock_external_api):
+    """
+    Tests a search cached before indexing is not served once new movies are indexed.
+    """
+    mock_fetch_movies.return_value = mock_external_api
+
+    response = client.get("/api/v1/movies/search?title=Matrix&page=1&size=10", headers=headers)
+    assert response.json()["total_results"] == 0
+
+    client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true", headers=headers)
+
+    response = client.get("/api/v1/movies/search?title=Matrix&page=1&size=10", headers=headers)
+    assert response.json()["total_results"] == 3
 
 
 def test_index_movies_invalid_token(client):
@@ -121,7 +180,7 @@ def test_external_api_timeout(mock_fetch_movies, client, headers):
         detail={"code": "EXTERNAL_API_TIMEOUT", "message": "The external API request timed out."}
     )
 
-    response = client.post("/api/v1/movies/index?title=Matrix&page=1", headers=headers)
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true", headers=headers)
 
     assert response.status_code == 504
     assert response.json()["detail"]["code"] == "EXTERNAL_API_TIMEOUT"
@@ -144,7 +203,285 @@ def test_search_movies(client, headers, setup_test_index):
     data = response.json()
     assert data["total_results"] == 3
     assert len(data["movies"]) == 3
-    
+
+
+def test_search_movies_cached_response(client, headers, setup_test_index):
+    """
+    Tests a cached search is served as the bytes stored on the first request, in the shape of
+    `MovieSearchResponse`, and revalidated with its `ETag`, without taking from the rate limit.
+    """
+    es.index(index=setup_test_index, id="test123", document={"Title": "The Matrix", "Year": 1999, "imdbID": "tt0133093"})
+    es.indices.refresh(index=setup_test_index)
+    url = "/api/v1/movies/search?title=Matrix&page=1&size=10&aggs=years"
+
+    with patch.object(search_budget.bucket, "take", AsyncMock(return_value=0)) as mock_take:
+        first = client.get(url, headers=headers)
+        with patch("app.routes.movies.search_movies_util") as mock_search:
+            second = client.get(url, headers=headers)
+            not_modified = client.get(url, headers={**headers, "If-None-Match": second.headers["ETag"]})
+    mock_search.assert_not_called()
+    mock_take.assert_awaited_once_with("user", 1)
+
+    assert (first.headers["X-FastAPI-Cache"], second.headers["X-FastAPI-Cache"]) == ("MISS", "HIT")
+    assert second.content == first.content
+    assert first.json() == MovieSearchResponse.model_validate(first.json()).model_dump()
+    assert not_modified.status_code == 304
+
+
+def test_search_movies_substring(client, headers, setup_test_index):
+    """
+    Tests `/search` matches a substring in the middle of the title, combined with the year filter.
+    """
+    test_index = setup_test_index
+
+    es.index(index=test_index, id="test123", document={"Title": "The Matrix", "Year": 1999, "imdbID": "tt0133093"})
+    es.index(index=test_index, id="test124", document={"Title": "The Matrix Reloaded", "Year": 2003, "imdbID": "tt0234215"})
+    es.index(index=test_index, id="test125", document={"Title": "Inception", "Year": 2010, "imdbID": "tt1375666"})
+    es.indices.refresh(index=test_index)
+
+    response = client.get("/api/v1/movies/search?title=atri&year=2003", headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_results"] == 1
+    assert data["movies"][0]["imdbID"] == "tt0234215"
+
+
+def test_search_movies_cursor_pagination(client, headers, setup_test_index):
+    """
+    Tests `/search` continues from `next_cursor` until the last page.
+    """
+    test_index = setup_test_index
+
+    for i in range(15):
+        es.index(index=test_index, id=f"test{i}", document={"Title": f"The Matrix {i}", "Year": 1999, "imdbID": f"tt{i:07}"})
+    es.indices.refresh(index=test_index)
+
+    response = client.get("/api/v1/movies/search?title=Matrix&page=1&size=10", headers=headers)
+
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page["movies"]) == 10
+    assert first_page["next_cursor"]
+
+    with patch("app.routes.movies.save_stale_result") as mock_save_stale_result:
+        response = client.get("/api/v1/movies/search", params={"title": "Matrix", "size": 10, "cursor": first_page["next_cursor"]}, headers=headers)
+    mock_save_stale_result.assert_not_called()
+
+    assert response.status_code == 200
+    second_page = response.json()
+    assert second_page["page"] == 2
+    assert len(second_page["movies"]) == 5
+    assert second_page["next_cursor"] is None
+    assert "X-FastAPI-Cache" not in response.headers  # Cursor pages outlive their point in time if cached
+
+    imdb_ids = {movie["imdbID"] for movie in first_page["movies"] + second_page["movies"]}
+    assert len(imdb_ids) == 15
+
+
+def test_search_movies_cursor_empty_page(client, headers, setup_test_index):
+    """
+    Tests a cursor followed with `size=0` returns an empty last page, closing its point in time.
+    """
+    test_index = setup_test_index
+
+    for i in range(15):
+        es.index(index=test_index, id=f"test{i}", document={"Title": f"The Matrix {i}", "Year": 1999, "imdbID": f"tt{i:07}"})
+    es.indices.refresh(index=test_index)
+
+    first_page = client.get("/api/v1/movies/search?title=Matrix&page=1&size=10", headers=headers).json()
+
+    async_es = get_async_es()
+    with patch.object(async_es, "close_point_in_time", wraps=async_es.close_point_in_time) as mock_close:
+        response = client.get("/api/v1/movies/search", params={"title": "Matrix", "size": 0, "cursor": first_page["next_cursor"]}, headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["movies"] == []
+    assert data["next_cursor"] is None
+    mock_close.assert_awaited_once()
+
+
+def test_search_movies_aggregations(client, headers, setup_test_index):
+    """
+    Tests `/search` returns the requested aggregations, and only them with `size=0`.
+    """
+    test_index = setup_test_index
+
+    for i, year in enumerate([1999, 2003, 2003, 2021]):
+        es.index(index=test_index, id=f"test{i}", document={"Title": f"The Matrix {i}", "Year": year, "imdbID": f"tt{i:07}"})
+    es.indices.refresh(index=test_index)
+
+    response = client.get("/api/v1/movies/search?title=Matrix&size=0&aggs=years&aggs=decades&aggs=year_range", headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["movies"] == []
+    assert data["total_results"] == 4
+    assert data["next_cursor"] is None
+    assert data["aggregations"] == {
+        "years": [{"key": 1999, "count": 1}, {"key": 2003, "count": 2}, {"key": 2021, "count": 1}],
+        "decades": [{"key": 1990, "count": 1}, {"key": 2000, "count": 2}, {"key": 2020, "count": 1}],
+        "min_year": 1999,
+        "max_year": 2021
+    }
+
+    response = client.get("/api/v1/movies/search?title=Matrix&aggs=unknown", headers=headers)
+    assert response.status_code == 422
+
+
+def test_search_movies_fields_and_capped_total(client, headers, setup_test_index):
+    """
+    Tests `/search` only returns the requested `fields`, and reports a total past `TRACK_TOTAL_HITS`
+    as a lower bound while still offering the next page.
+    """
+    test_index = setup_test_index
+
+    for i in range(5):
+        es.index(index=test_index, id=f"test{i}", document={"Title": f"The Matrix {i}", "Year": 1999, "imdbID": f"tt{i:07}"})
+    es.indices.refresh(index=test_index)
+
+    with patch("app.elastic_utils.TRACK_TOTAL_HITS", 3):
+        response = client.get("/api/v1/movies/search?title=Matrix&size=2&fields=imdbID&fields=Year", headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["movies"] == [{"Year": 1999, "imdbID": "tt0000000"}, {"Year": 1999, "imdbID": "tt0000001"}]
+    assert MovieSearchResponse.model_validate(data).model_dump(exclude_unset=True)["movies"] == data["movies"]
+    assert (data["total_results"], data["total_relation"]) == (3, "gte")
+    assert data["next_cursor"] is not None
+
+    response = client.get("/api/v1/movies/search?title=Matrix&fields=Plot", headers=headers)
+    assert response.status_code == 422
+
+
+def test_search_movies_batch(client, headers, setup_test_index):
+    """
+    Tests `/search/batch` returns results in order and only sends the searches missing from the cache to Elasticsearch,
+    counting each of them against the rate limit.
+    """
+    test_index = setup_test_index
+
+    es.index(index=test_index, id="test1", document={"Title": "The Matrix", "Year": 1999, "imdbID": "tt0133093"})
+    es.index(index=test_index, id="test2", document={"Title": "Inception", "Year": 2010, "imdbID": "tt1375666"})
+    es.indices.refresh(index=test_index)
+
+    client.get("/api/v1/movies/search?title=Matrix&page=1&size=10", headers=headers)
+
+    searches = [{"title": "Inception"}, {"title": "Matrix"}, {"title": "Nothing", "year": 2000, "size": 5}]
+    with patch("app.routes.movies.msearch_movies_util", wraps=msearch_movies) as mock_msearch, \
+            patch.object(search_budget.bucket, "take", AsyncMock(return_value=0)) as mock_take:
+        response = client.post("/api/v1/movies/search/batch", json=searches, headers=headers)
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["total_results"] for result in results] == [1, 1, 0]
+    assert results[0]["movies"][0]["imdbID"] == "tt1375666"
+    assert results[1]["movies"][0]["imdbID"] == "tt0133093"
+    assert results[2]["size"] == 5
+
+    missed = mock_msearch.call_args.args[0]
+    assert [search["title"] for search in missed] == ["Inception", "Nothing"]
+    mock_take.assert_awaited_once_with("user", 2)
+
+
+def test_search_movies_invalid_cursor(client, headers):
+    """
+    Tests `/search` rejects a malformed cursor.
+    """
+    response = client.get("/api/v1/movies/search?title=Matrix&cursor=not-a-cursor", headers=headers)
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["code"] == "INVALID_CURSOR"
+
+
+def test_search_movies_page_too_deep(client, headers):
+    """
+    Tests `/search` refuses `page` beyond the max result window.
+    """
+    response = client.get("/api/v1/movies/search?title=Matrix&page=101&size=100", headers=headers)
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["code"] == "PAGE_TOO_DEEP"
+
+
+def test_search_movies_cursor_past_result_window(client, headers):
+    """
+    Tests the cursor of the last pages reachable with `page` continues after their last hit,
+    since Elasticsearch refuses `from` past the max result window even inside a point in time.
+    """
+    hits = [{"_source": {"Title": f"Matrix {i}", "Year": 1999, "imdbID": f"tt{i:07}"}, "sort": [1.0, f"tt{i:07}"]} for i in range(100)]
+    response = {"hits": {"total": {"value": 10000, "relation": "gte"}, "hits": hits}}
+
+    state = decode_cursor(search_result(response, "Matrix", None, 100, 100)["next_cursor"], "Matrix")
+    assert (state["from"], state["after"]) == (None, [1.0, "tt0000099"])
+
+    state = decode_cursor(search_result(response, "Matrix", None, 99, 100)["next_cursor"], "Matrix")
+    assert (state["from"], state["after"]) == (9900, None)
+
+    # A `from` cursor followed with a larger page is refused before reaching Elasticsearch
+    cursor = encode_cursor({"title": "Matrix", "year": None, "page": 100, "from": 9950, "pit": None, "after": None})
+    response = client.get("/api/v1/movies/search", params={"title": "Matrix", "size": 100, "cursor": cursor}, headers=headers)
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["code"] == "PAGE_TOO_DEEP"
+
+
+def test_export_movies_ndjson(client, headers, setup_test_index):
+    """
+    Tests `/export` streams every matching movie as NDJSON, across several batches.
+    """
+    test_index = setup_test_index
+
+    for i in range(10):
+        es.index(index=test_index, id=f"test{i}", document={"Title": f"The Matrix {i}", "Year": 1999, "imdbID": f"tt{i:07}"})
+    es.index(index=test_index, id="other", document={"Title": "Inception", "Year": 2010, "imdbID": "tt1375666"})
+    es.indices.refresh(index=test_index)
+
+    with patch("app.routes.movies.scan_movies_util", side_effect=lambda **kwargs: scan_movies(batch_size=4, **kwargs)):
+        response = client.get("/api/v1/movies/export?title=Matrix", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    movies = [json.loads(line) for line in response.text.splitlines()]
+    assert len(movies) == 10
+    assert {movie["imdbID"] for movie in movies} == {f"tt{i:07}" for i in range(10)}
+
+
+def test_export_movies_csv(client, headers, setup_test_index):
+    """
+    Tests `/export?format=csv` streams a header row followed by one row per movie.
+    """
+    test_index = setup_test_index
+
+    es.index(index=test_index, id="test1", document={"Title": "The Matrix", "Year": 1999, "imdbID": "tt0133093"})
+    es.indices.refresh(index=test_index)
+
+    response = client.get("/api/v1/movies/export?title=Matrix&format=csv", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == ["Title,Year,imdbID", "The Matrix,1999,tt0133093"]
+
+
+def test_build_search_query():
+    """
+    Tests the title goes through the n-gram subfield and the year through a filter.
+    """
+    query = build_search_query(title="Matrix", year=1999)
+
+    assert query["bool"]["must"] == [{"match_phrase": {"Title.ngram": "Matrix"}}]
+    assert query["bool"]["filter"] == [{"term": {"Year": 1999}}]
+
+    short_query = build_search_query(title="X*")
+
+    assert short_query["bool"]["must"] == [
+        {"wildcard": {"Title.keyword": {"value": "*X\\**", "case_insensitive": True}}}
+    ]
+    assert short_query["bool"]["filter"] == []
+
+
 @patch("app.elastic_utils.fetch_movies_from_api")
 def test_search_movies_no_results(mock_fetch_movies, client, headers, setup_test_index, mock_external_api):
     """
@@ -180,7 +517,7 @@ def test_index_movies_no_results(mock_fetch_movies, client, headers, setup_test_
         "data": []
     }
 
-    response = client.post("/api/v1/movies/index?title=NonExistent&page=1", headers=headers)
+    response = client.post("/api/v1/movies/index?title=NonExistent&page=1&wait=true", headers=headers)
 
     assert response.status_code == 200
     data = response.json()
@@ -209,7 +546,7 @@ def test_index_movies_multiple_pages(mock_fetch_movies, client, headers, setup_t
         }
     ]
 
-    response = client.post("/api/v1/movies/index?title=Movies&page=1", headers=headers)
+    response = client.post("/api/v1/movies/index?title=Movies&page=1&wait=true", headers=headers)
 
     assert response.status_code == 200
     data = response.json()
@@ -232,13 +569,13 @@ def test_index_movies_invalid_data(mock_fetch_movies, client, headers, setup_tes
         ]
     }
 
-    response = client.post("/api/v1/movies/index?title=Matrix&page=1", headers=headers)
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true", headers=headers)
 
     assert response.status_code == 500
     
 @patch("app.elastic_utils.fetch_movies_from_api")
-@patch("app.database.es.index")
-def test_index_movies_elasticsearch_failure(mock_es_index, mock_fetch_movies, client, headers, setup_test_index):
+@patch("app.elastic_utils.async_streaming_bulk")
+def test_index_movies_elasticsearch_failure(mock_streaming_bulk, mock_fetch_movies, client, headers, setup_test_index):
     """
     Tests `/index` when Elasticsearch fails.
     """
@@ -254,13 +591,69 @@ def test_index_movies_elasticsearch_failure(mock_es_index, mock_fetch_movies, cl
         ]
     }
 
-    mock_es_index.side_effect = Exception("Elasticsearch down")
+    mock_streaming_bulk.side_effect = Exception("Elasticsearch down")
 
-    response = client.post("/api/v1/movies/index?title=Matrix&page=1", headers=headers)
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true", headers=headers)
 
     assert response.status_code == 500
     assert response.json()["code"] == "SERVER_ERROR"
 
+@patch("app.elastic_utils.fetch_movies_from_api")
+@patch("app.elastic_utils.async_streaming_bulk")
+def test_index_movies_bulk_item_errors(mock_streaming_bulk, mock_fetch_movies, client, headers, setup_test_index, mock_external_api):
+    """
+    Tests `/index` reports the documents rejected by the `_bulk` API without failing the whole load.
+    """
+    mock_fetch_movies.return_value = mock_external_api
+    mock_streaming_bulk.return_value = bulk_results(
+        (True, {"index": {"_id": "tt0133093", "status": 201}}),
+        (False, {"index": {"_id": "tt0234215", "status": 400, "error": {"type": "mapper_parsing_exception"}}}),
+        (True, {"index": {"_id": "tt0242653", "status": 201}})
+    )
+
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true", headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "Movies indexed with errors"
+    assert data["total_indexed"] == 2
+    assert data["total_failed"] == 1
+    assert data["errors"][0]["imdbID"] == "tt0234215"
+    assert data["errors"][0]["status"] == 400
+
+@patch("app.elastic_utils.fetch_movies_from_api")
+def test_reindex_movies_swaps_alias(mock_fetch_movies, client, headers, setup_test_index, mock_external_api):
+    """
+    Tests `/index?reindex=true` loads a new index version and points the alias to it.
+    """
+    test_index = setup_test_index
+    mock_fetch_movies.return_value = mock_external_api
+
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1&reindex=true&wait=true", headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "Movies reindexed"
+    assert data["index"] == f"{test_index}_v2"
+    assert data["total_indexed"] == 3
+    assert list(es.indices.get_alias(name=test_index)) == [f"{test_index}_v2"]
+
+
+@patch("app.elastic_utils.fetch_movies_from_api")
+def test_reindex_movies_without_results(mock_fetch_movies, client, headers, setup_test_index):
+    """
+    Tests a reindex that fetches no movies leaves the alias on the current index.
+    """
+    test_index = setup_test_index
+    mock_fetch_movies.return_value = {"page": 1, "per_page": 10, "total": 0, "total_pages": 0, "data": []}
+
+    response = client.post("/api/v1/movies/index?title=NonExistent&page=1&reindex=true&wait=true", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "Reindex aborted, no movies fetched"
+    assert list(es.indices.get_alias(name=test_index)) == [f"{test_index}_v1"]
+
+
 def test_index_movies_invalid_token(client):
     """
     Tests unauthorized access to `/index` endpoint.
@@ -268,4 +661,302 @@ def test_index_movies_invalid_token(client):
     response = client.post("/api/v1/movies/index?title=Matrix&page=1")
 
     assert response.status_code == 401
-    assert response.json()["detail"]["code"] == "MISSING_TOKEN"
\ No newline at end of file
+    assert response.json()["detail"]["code"] == "MISSING_TOKEN"
+
+
+@patch("app.sources.MOVIES_API_BACKOFF", 0)
+@patch("app.sources.session.get")
+def test_fetch_movies_retries_server_errors(mock_get, mock_external_api):
+    """
+    Tests the external API fetch retries timeouts and 5xx responses before giving up.
+    """
+    ok_response = MagicMock(status_code=200)
+    ok_response.json.return_value = mock_external_api
+    mock_get.side_effect = [requests.Timeout(), MagicMock(status_code=503), ok_response]
+
+    assert fetch_movies_from_api("Matrix", 1) == mock_external_api
+    assert mock_get.call_count == 3
+
+
+@patch("app.sources.MOVIES_API_BACKOFF", 0)
+@patch("app.sources.session.get")
+def test_fetch_movies_timeout_after_retries(mock_get):
+    """
+    Tests the external API fetch maps a persistent timeout to a 504 error.
+    """
+    mock_get.side_effect = requests.Timeout()
+
+    with pytest.raises(HTTPException) as exc_info:
+        fetch_movies_from_api("Matrix", 1)
+
+    assert exc_info.value.status_code == 504
+
+
+@patch("app.routes.movies.job_manager", IndexJobManager(workers=0))
+def test_index_movies_background_job(client, headers):
+    """
+    Tests `/index` enqueues a background job that can be followed and cancelled.
+    """
+    response = client.post("/api/v1/movies/index?title=Matrix&page=1", headers=headers)
+
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued"
+
+    response = client.get(f"/api/v1/movies/index/jobs/{job['job_id']}", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["job_id"] == job["job_id"]
+
+    response = client.delete(f"/api/v1/movies/index/jobs/{job['job_id']}", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+
+
+def test_index_job_not_found(client, headers):
+    """
+    Tests `/index/jobs/{job_id}` with an unknown job id.
+    """
+    response = client.get("/api/v1/movies/index/jobs/unknown", headers=headers)
+
+    assert response.status_code == 404
+    assert response.json()["detail"]["code"] == "JOB_NOT_FOUND"
+
+
+def test_healthz(client):
+    """
+    Tests the liveness probe answers without any dependency.
+    """
+    response = client.get("/healthz")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+
+
+def test_metrics(client, headers, setup_test_index):
+    """
+    Tests `/metrics` exposes request durations per route template and Elasticsearch query durations.
+    """
+    client.get("/api/v1/movies/search?title=Matrix&page=1&size=10", headers=headers)
+    client.get("/api/v1/movies/index/jobs/unknown", headers=headers)
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/movies/search",status="200"}' in response.text
+    assert 'route="/api/v1/movies/index/jobs/{job_id}",status="404"' in response.text
+    assert 'elasticsearch_request_duration_seconds_count{operation="search"}' in response.text
+    assert "threadpool_size" in response.text
+
+
+def test_slow_queries(client, headers, setup_test_index):
+    """
+    Tests searches slower than the threshold are listed by the admin endpoint with their request body.
+    """
+    log = SlowQueryLog(threshold_ms=0, max_entries=2)
+
+    with patch("app.elastic_utils.slow_query_log", log), patch("app.routes.admin.slow_query_log", log):
+        for title in ("Matrix", "Star", "Ma"):
+            client.get(f"/api/v1/movies/search?title={title}&page=1&size=10", headers=headers)
+
+        response = client.get("/api/v1/admin/slow-queries", headers=headers)
+        assert response.status_code == 200
+        entries = response.json()
+        assert sorted(entry["params"]["title"] for entry in entries) == ["Ma", "Star"]  # Only the latest 2 are kept
+        short_title = next(entry for entry in entries if entry["params"]["title"] == "Ma")
+        assert "wildcard" in short_title["body"]["query"]["bool"]["must"][0]
+        assert short_title["profile"] is None
+
+        assert client.delete("/api/v1/admin/slow-queries", headers=headers).status_code == 204
+        assert client.get("/api/v1/admin/slow-queries", headers=headers).json() == []
+
+
+def test_slow_queries_cursor_pages(client, headers, setup_test_index):
+    """
+    Tests slow cursor pages are recorded too, with a body that can be profiled without their point in time.
+    """
+    for i in range(3):
+        es.index(index=setup_test_index, id=f"tt{i}", document={"Title": f"Matrix {i}", "Year": 1999, "imdbID": f"tt{i}"})
+    es.indices.refresh(index=setup_test_index)
+    log = SlowQueryLog(threshold_ms=0)
+
+    with patch("app.elastic_utils.slow_query_log", log):
+        first = client.get("/api/v1/movies/search?title=Matrix&size=2", headers=headers).json()
+        client.get(f"/api/v1/movies/search?title=Matrix&size=2&cursor={first['next_cursor']}", headers=headers)
+
+    entry = next(entry for entry in log.entries if entry["operation"] == "search_after")
+    assert (entry["params"]["title"], entry["params"]["page"]) == ("Matrix", 2)
+    assert "pit" not in entry["body"] and entry["body"]["sort"] == SEARCH_SORT
+
+
+def test_slow_queries_profile():
+    """
+    Tests a sampled slow search is run again with `profile: true` and its shard timings are kept.
+    """
+    profile = {"shards": [{
+        "id": "[node][movies][0]",
+        "searches": [{
+            "query": [{"type": "WildcardQuery", "description": "Title.keyword:*ma*", "time_in_nanos": 2_500_000}],
+            "collector": [{"name": "TopScoreDocCollector", "time_in_nanos": 500_000}]
+        }],
+        "aggregations": []
+    }]}
+    log = SlowQueryLog(threshold_ms=0, profile_ratio=1)
+
+    async def record():
+        with patch("app.slow_queries.get_async_es") as mock_get_async_es:
+            mock_get_async_es.return_value.search = AsyncMock(return_value={"profile": profile})
+            entry = log.record("search", {"query": {"match_all": {}}, "from": 10, "size": 10}, {}, 1.5, {"took": 1400})
+            await asyncio.gather(*log.tasks)
+            mock_get_async_es.return_value.search.assert_awaited_once_with(
+                index=INDEX_NAME, body={"query": {"match_all": {}}, "from": 10, "size": 10, "profile": True}
+            )
+        return entry
+
+    entry = asyncio.run(record())
+
+    assert entry["elapsed_ms"] == 1500 and entry["took_ms"] == 1400
+    assert entry["profile"] == [{
+        "id": "[node][movies][0]", "query_ms": 2.5, "collector_ms": 0.5, "aggregations_ms": 0,
+        "queries": [{"type": "WildcardQuery", "description": "Title.keyword:*ma*", "time_ms": 2.5}]
+    }]
+
+
+def test_tracing(client, headers, setup_test_index):
+    """
+    Tests a request is traced as a server span continuing the caller's trace, with the middlewares,
+    JWT verification and Elasticsearch query as its descendants.
+    """
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from app.security import token_cache
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    token_cache.clear()
+
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    with patch("app.tracing.tracer", provider.get_tracer("test")):
+        response = client.get(
+            "/api/v1/movies/search?title=Matrix&page=1&size=10",
+            headers={**headers, "Cache-Control": "no-cache", "traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"}
+        )
+
+    assert response.status_code == 200
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    root = spans["GET /api/v1/movies/search"]
+    assert format(root.context.trace_id, "032x") == trace_id
+    assert root.attributes["http.route"] == "/api/v1/movies/search"
+    assert root.attributes["http.response.status_code"] == 200
+
+    for name in ("middleware.metrics", "middleware.error_handler", "jwt.verify", "elasticsearch.search"):
+        assert spans[name].context.trace_id == root.context.trace_id
+    assert spans["middleware.metrics"].parent.span_id == root.context.span_id
+
+    search = spans["elasticsearch.search"].attributes
+    assert search["query"] == ("bool(must=[match_phrase(Title.ngram)])",)
+    assert search["sort"] == ("_score", "imdbID")
+    assert "took" in search
+
+
+@patch("app.elastic_utils.BULK_CHUNK_SIZE", 2)
+@patch("app.elastic_utils.fetch_movies_from_api")
+def test_tracing_bulk_requests(mock_fetch_movies, client, headers, setup_test_index, mock_external_api):
+    """
+    Tests each `_bulk` request of an indexing is traced as its own span, with the documents it sends.
+    """
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    mock_fetch_movies.return_value = mock_external_api
+
+    with patch("app.tracing.tracer", provider.get_tracer("test")):
+        response = client.post("/api/v1/movies/index?title=Matrix&page=1&wait=true", headers=headers)
+
+    assert response.status_code == 200
+
+    bulks = [span for span in exporter.get_finished_spans() if span.name == "elasticsearch.bulk"]
+    assert [span.attributes["documents"] for span in bulks] == [2, 1]
+
+
+@patch("app.elastic_utils.index_ready", True)
+@patch("app.routes.health.redis_client")
+@patch("app.routes.health.get_async_es")
+def test_readyz_elasticsearch_down(mock_get_async_es, mock_redis, client):
+    """
+    Tests the readiness probe reports an unreachable Elasticsearch.
+    """
+    mock_get_async_es.return_value.ping = AsyncMock(return_value=False)
+    mock_redis.ping = AsyncMock(return_value=True)
+
+    response = client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.json() == {"status": "unavailable", "elasticsearch": "down", "redis": "up", "index": "up"}
+
+
+def test_create_index_migrates_legacy_index(client, headers, setup_test_index):
+    """
+    Tests an index created before the explicit mappings (dynamic `imdbID` text field, no `Title.ngram`)
+    is copied to a versioned index with the current mappings and swapped behind the alias, after
+    which substring searches (sorted on `imdbID`) work and the readiness probe reports the index up.
+    """
+    test_index = setup_test_index
+    es.indices.delete(index=f"{test_index}_v1")
+    es.index(index=test_index, id="tt0133093", document={"Title": "The Matrix", "Year": 1999, "imdbID": "tt0133093"}, refresh=True)
+
+    with patch("app.elastic_utils.index_ready", False):
+        client.portal.call(create_index)
+
+        assert elastic_utils.index_ready
+
+    aliases = es.indices.get_alias(name=test_index)
+    assert list(aliases) == [f"{test_index}_v1"]
+    assert es.indices.get_mapping(index=test_index)[f"{test_index}_v1"]["mappings"]["_meta"]["version"] == MAPPING_VERSION
+
+    response = client.get("/api/v1/movies/search?title=atri", headers=headers)
+    assert response.status_code == 200
+    assert [movie["imdbID"] for movie in response.json()["movies"]] == ["tt0133093"]
+
+
+@patch("app.middleware.error_handler.get_stale_result")
+@patch("app.elastic_utils.get_async_es")
+def test_search_movies_degraded(mock_get_async_es, mock_get_stale_result, client, headers):
+    """
+    Tests `/search` serves the last known result while Elasticsearch is unreachable.
+    """
+    stale = {"movies": [{"Title": "The Matrix", "Year": 1999, "imdbID": "tt0133093"}], "total_results": 1, "page": 1, "size": 10}
+    mock_get_async_es.return_value.search = AsyncMock(side_effect=ElasticsearchConnectionError("Elasticsearch down"))
+    mock_get_stale_result.return_value = stale
+
+    response = client.get("/api/v1/movies/search?title=Degraded&page=1&size=10", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["X-Degraded"] == "stale"
+    assert response.json() == stale
+
+
+@patch("app.middleware.error_handler.get_stale_result")
+@patch("app.elastic_utils.get_async_es")
+def test_search_movies_elasticsearch_unavailable(mock_get_async_es, mock_get_stale_result, client, headers):
+    """
+    Tests `/search` answers 503 while Elasticsearch is unreachable and there is no previous result.
+    """
+    mock_get_async_es.return_value.search = AsyncMock(side_effect=ElasticsearchConnectionError("Elasticsearch down"))
+    mock_get_stale_result.return_value = None
+
+    response = client.get("/api/v1/movies/search?title=Unavailable&page=1&size=10", headers=headers)
+
+    assert response.status_code == 503
+    assert response.json()["detail"]["code"] == "ELASTICSEARCH_UNAVAILABLE"
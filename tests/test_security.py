@@ -0,0 +1,81 @@
+import json
+import os
+import time
+import jwt
+import pytest
+
+from unittest.mock import patch
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from jwt.algorithms import OKPAlgorithm
+from app.security import KeyStore, SECRET_KEY, token_cache, validate_jwt_token, verify_token
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    token_cache.clear()
+
+
+def write_jwks(path, keys):
+    """
+    Write a JWKS file holding the public part of `keys` (kid -> Ed25519 private key).
+    """
+    jwks = {"keys": [dict(json.loads(OKPAlgorithm.to_jwk(key.public_key())), kid=kid, alg="EdDSA") for kid, key in keys.items()]}
+    path.write_text(json.dumps(jwks))
+
+
+def test_verify_token_cached():
+    """
+    Tests a valid token is only decoded once, and an invalid one is remembered as invalid.
+    """
+    token = jwt.encode({"sub": "user", "exp": int(time.time()) + 60}, SECRET_KEY, algorithm="HS256")
+
+    with patch("app.security.jwt.decode", wraps=jwt.decode) as mock_decode:
+        assert verify_token(token)["sub"] == "user"
+        assert verify_token(token)["sub"] == "user"
+        assert verify_token("not-a-token") == "INVALID_TOKEN"
+        assert verify_token("not-a-token") == "INVALID_TOKEN"
+
+    assert mock_decode.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_validate_jwt_token_honors_exp():
+    """
+    Tests a verified token is only cached until its `exp`.
+    """
+    exp = int(time.time()) + 60
+    token = jwt.encode({"sub": "user", "exp": exp}, SECRET_KEY, algorithm="HS256")
+
+    assert (await validate_jwt_token(token))["sub"] == "user"
+
+    (token_hash, (expires_at, _)), = token_cache.entries.items()
+    assert expires_at == exp
+
+    with patch("app.security.time.time", return_value=exp):
+        assert token_cache.get(token_hash) is None
+
+
+def test_key_store_jwks_rotation(tmp_path):
+    """
+    Tests tokens are verified with the JWKS key named by their `kid`, including keys added after startup.
+    """
+    old_key, new_key = Ed25519PrivateKey.generate(), Ed25519PrivateKey.generate()
+    jwks_file = tmp_path / "jwks.json"
+    write_jwks(jwks_file, {"old": old_key})
+
+    store = KeyStore(str(jwks_file))
+    store.load(force=True)
+
+    token = jwt.encode({"sub": "user"}, old_key, algorithm="EdDSA", headers={"kid": "old"})
+    key, algorithms = store.get_key(token)
+    assert jwt.decode(token, key, algorithms=algorithms)["sub"] == "user"
+
+    write_jwks(jwks_file, {"old": old_key, "new": new_key})
+    os.utime(jwks_file, (time.time() + 1, time.time() + 1))
+
+    token = jwt.encode({"sub": "user"}, new_key, algorithm="EdDSA", headers={"kid": "new"})
+    key, algorithms = store.get_key(token)
+    assert jwt.decode(token, key, algorithms=algorithms)["sub"] == "user"
+
+    with pytest.raises(jwt.InvalidTokenError):
+        store.get_key(jwt.encode({"sub": "user"}, new_key, algorithm="EdDSA", headers={"kid": "unknown"}))
@@ -0,0 +1,125 @@
+import json
+import os
+import pytest
+import requests
+
+from unittest.mock import MagicMock, patch
+from app.elastic_utils import fetch_movie_pages
+from app.sources import HttpMovieSource, NdjsonMovieSource, PageCache, build_movie_source
+
+MOVIES = [
+    {"Title": "The Matrix", "Year": 1999, "imdbID": "tt0133093"},
+    {"Title": "The Matrix Reloaded", "Year": 2003, "imdbID": "tt0234215"},
+    {"Title": "Star Wars", "Year": 1977, "imdbID": "tt0076759"},
+    {"Title": "The Matrix Revolutions", "Year": 2003, "imdbID": "tt0242653"}
+]
+
+PAGE = {"page": 1, "per_page": 10, "total": 1, "total_pages": 1, "data": MOVIES[:1]}
+
+
+def api_response(status_code: int, body: dict = None, etag: str = None):
+    response = MagicMock(status_code=status_code, headers={"ETag": etag} if etag else {})
+    response.json.return_value = body
+    return response
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PageCache(str(tmp_path / "pages.sqlite3"), ttl=60, max_bytes=1024 * 1024)
+
+
+@patch("app.sources.session.get")
+def test_http_source_serves_fresh_pages_from_cache(mock_get, cache):
+    """
+    Tests a page fetched once is read from the disk cache while it is fresh, even by another source.
+    """
+    mock_get.return_value = api_response(200, PAGE, etag='"v1"')
+
+    assert HttpMovieSource(cache=cache).fetch_page("Matrix", 1) == PAGE
+    assert HttpMovieSource(cache=cache).fetch_page("Matrix", 1) == PAGE
+    assert mock_get.call_count == 1
+
+
+@patch("app.sources.MOVIES_API_BACKOFF", 0)
+@patch("app.sources.session.get")
+def test_http_source_revalidates_expired_pages(mock_get, cache):
+    """
+    Tests an expired page is revalidated with its ETag, and still served while the API is unreachable.
+    """
+    source = HttpMovieSource(cache=cache)
+    mock_get.return_value = api_response(200, PAGE, etag='"v1"')
+    source.fetch_page("Matrix", 1)
+
+    cache.ttl = 0
+    mock_get.return_value = api_response(304)
+    assert source.fetch_page("Matrix", 1) == PAGE
+    assert mock_get.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+
+    mock_get.side_effect = requests.ConnectionError("API down")
+    assert source.fetch_page("Matrix", 1) == PAGE
+
+
+def test_page_cache_evicts_least_recently_used(cache):
+    """
+    Tests the least recently used pages are evicted once the cache exceeds its size.
+    """
+    for page in range(3):
+        cache.set(f"page-{page}", "etag", {"data": [str(page) * 1000]})
+    cache.get("page-0")
+
+    cache.max_bytes = sum(row[0] for row in cache.connection.execute("SELECT size FROM pages")) - 1
+    cache.set("page-0", "etag", {"data": ["0" * 1000]})
+
+    assert cache.get("page-1") is None
+    assert cache.get("page-0") is not None and cache.get("page-2") is not None
+
+
+def test_ndjson_source(tmp_path):
+    """
+    Tests a local NDJSON dump is paged like the external API, matching titles case-insensitively,
+    and keeps only the offsets of the matching lines.
+    """
+    path = tmp_path / "movies.ndjson"
+    path.write_text("".join(json.dumps(movie) + "\n" for movie in MOVIES))
+    source = NdjsonMovieSource(str(path), per_page=2)
+
+    first = source.fetch_page("matrix", 1)
+    assert (first["total"], first["total_pages"], first["data"]) == (3, 2, MOVIES[:2])
+    assert source.fetch_page("matrix", 2)["data"] == MOVIES[3:]
+    assert [len(offsets) for offsets in source.offsets.values()] == [3]
+
+    pages = list(fetch_movie_pages("matrix", 1, source))
+    assert sorted(movie["imdbID"] for page in pages for movie in page["data"]) == sorted(
+        movie["imdbID"] for movie in MOVIES if "Matrix" in movie["Title"]
+    )
+
+
+def test_ndjson_source_keeps_offsets_of_recent_titles(tmp_path):
+    """
+    Tests the offsets of the last `max_titles` titles are reused, so interleaved loads do not scan
+    the file again, and are built again once the file changes.
+    """
+    path = tmp_path / "movies.ndjson"
+    path.write_text("".join(json.dumps(movie) + "\n" for movie in MOVIES))
+    source = NdjsonMovieSource(str(path), per_page=2, max_titles=2)
+
+    for title in ("matrix", "star", "matrix", "wars"):
+        source.fetch_page(title, 1)
+    assert [title for title, _ in source.offsets] == ["matrix", "wars"]
+
+    with patch("builtins.open", wraps=open) as mock_open:
+        assert source.fetch_page("matrix", 2)["data"] == MOVIES[3:]
+    assert mock_open.call_count == 1  # The page only, without scanning the file
+
+    path.write_text(json.dumps(MOVIES[0]) + "\n")
+    os.utime(path, (0, 0))
+    assert source.fetch_page("matrix", 1)["total"] == 1
+
+
+def test_ndjson_source_requires_file():
+    """
+    Tests the NDJSON source refuses to start without `MOVIES_SOURCE_FILE`.
+    """
+    with patch("app.sources.MOVIES_SOURCE", "ndjson"), patch("app.sources.MOVIES_SOURCE_FILE", None):
+        with pytest.raises(ValueError):
+            build_movie_source()